@@ -0,0 +1,339 @@
+"""Benchmark API trackera: N klientów odpytujących /changes + serie zapisów.
+
+Uruchamia server.app lokalnie - przez klienta testowego Flaska (w tym samym procesie, bez sieci)
+albo pod gunicornem na localhost - i mierzy przepustowość oraz opóźnienia p50/p95/p99 każdego
+endpointu, a także zapisy na dysk na jedną mutację. Wynik trafia do pliku JSON, który można
+porównać z poprzednim przebiegiem (--compare), np. przed wdrożeniem.
+
+Przykłady:
+    python benchmark.py --mode testclient --clients 50 --duration 20 --output bench.json
+    python benchmark.py --mode gunicorn --workers 4 --threads 50 --backend sqlite --compare bench.json
+
+Stan serwera jest tworzony w katalogu tymczasowym, więc benchmark nie dotyka boss_state.json.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Metryki porównywane przez --compare (większa wartość = gorzej, poza przepustowością)
+COMPARED_LATENCIES = ("p50_ms", "p95_ms", "p99_ms")
+
+
+class TestClientTarget:
+    """Żądania przez klienta testowego Flaska - mierzy sam kod serwera, bez sieci i WSGI serwera."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def get(self, path, params=None, headers=None):
+        response = self._client().get(path, query_string=params, headers=headers)
+        return response.status_code, response.headers.get("ETag"), response.get_json(silent=True)
+
+    def post(self, path, payload=None):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.headers.get("ETag"), response.get_json(silent=True)
+
+
+class HttpTarget:
+    """Żądania HTTP do serwera na localhost (jedna sesja keep-alive na wątek, jak klient)."""
+
+    def __init__(self, base_url):
+        import requests
+        self._requests = requests
+        self.base_url = base_url
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+        return session
+
+    def get(self, path, params=None, headers=None):
+        response = self._session().get(self.base_url + path, params=params, headers=headers, timeout=30)
+        data = response.json() if response.status_code == 200 else None
+        return response.status_code, response.headers.get("ETag"), data
+
+    def post(self, path, payload=None):
+        response = self._session().post(self.base_url + path, json=payload, timeout=30)
+        return response.status_code, response.headers.get("ETag"), response.json()
+
+
+class Recorder:
+    """Zbiera czasy odpowiedzi (sekundy) i błędy per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def timed(self, endpoint, call, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = call(*args, **kwargs)
+        except Exception:
+            self._error(endpoint)
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+        if result[0] >= 400:
+            self._error(endpoint)
+        return result
+
+    def _error(self, endpoint):
+        with self._lock:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(sorted_values, fraction):
+    """Percentyl metodą najbliższej pozycji z posortowanej listy."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def poller(target, recorder, stop, poll_interval_s):
+    """Klient odpytujący /changes tak jak client_app (since + boot + If-None-Match)."""
+    since, boot, etag = 0, None, None
+    while not stop.is_set():
+        params = {"since": since}
+        if boot:
+            params["boot"] = boot
+        headers = {"If-None-Match": etag} if etag else None
+        result = recorder.timed("/changes", target.get, "/changes", params=params, headers=headers)
+        if result is not None and result[0] == 200 and result[2]:
+            etag = result[1]
+            since, boot = result[2].get("version", since), result[2].get("boot", boot)
+        if poll_interval_s:
+            stop.wait(poll_interval_s * random.uniform(0.5, 1.5))
+
+def writer(target, recorder, stop, keys, channels, burst_size, burst_interval_s, mutations):
+    """Co `burst_interval_s` wysyła serię `burst_size` zbić i jeden reset kanału."""
+    while not stop.is_set():
+        for _ in range(burst_size):
+            payload = {"key": random.choice(keys), "timestamp": datetime.now().isoformat()}
+            if recorder.timed("/update_boss_status", target.post, "/update_boss_status", payload) is not None:
+                mutations.append(1)
+        channel = random.choice(channels)
+        if recorder.timed("/reset_channel/<channel_name>", target.post, f"/reset_channel/{channel}") is not None:
+            mutations.append(1)
+        stop.wait(burst_interval_s)
+
+def read_proc_io(pids):
+    """Sumuje liczniki zapisu z /proc/<pid>/io (Linux). Zwraca None, jeśli są niedostępne."""
+    totals = {"wchar": 0, "syscw": 0, "write_bytes": 0}
+    try:
+        for pid in pids:
+            with open(f"/proc/{pid}/io") as f:
+                for line in f:
+                    name, value = line.split(":")
+                    if name in totals:
+                        totals[name] += int(value)
+    except (OSError, ValueError):
+        return None
+    return totals
+
+def child_pids(pid):
+    """Bezpośrednie procesy potomne (workery gunicorna) z /proc."""
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_gunicorn(args, work_dir):
+    """Uruchamia gunicorna z server:app w katalogu roboczym i czeka, aż zacznie odpowiadać."""
+    import requests
+    port = free_port()
+    env = dict(os.environ, STATE_BACKEND=args.backend, PYTHONPATH=REPO_DIR)
+    command = [sys.executable, "-m", "gunicorn", "server:app", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(args.workers), "--worker-class", "gthread", "--threads", str(args.threads),
+               "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=work_dir, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn zakończył się z kodem {process.returncode}")
+        try:
+            requests.get(base_url + "/get_state", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn nie zaczął odpowiadać w ciągu 30 s")
+
+def summarize(recorder, duration_s):
+    endpoints = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        values.sort()
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throughput_rps": round(len(values) / duration_s, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+    return endpoints
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(result, baseline_file, max_regression):
+    """Wypisuje zmiany względem poprzedniego wyniku. Zwraca listę regresji większych niż `max_regression`."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nPorównanie z {baseline_file} (commit {baseline.get('meta', {}).get('commit')}):")
+    for endpoint, current in result["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        for metric in COMPARED_LATENCIES + ("throughput_rps",):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Dla przepustowości regresją jest spadek
+            worse = -change if metric == "throughput_rps" else change
+            marker = "  <-- REGRESJA" if worse > max_regression else ""
+            print(f"  {endpoint:32} {metric:15} {old:10.3f} -> {new:10.3f} ({change:+.1%}){marker}")
+            if marker:
+                regressions.append((endpoint, metric, old, new))
+    return regressions
+
+def run(args):
+    original_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="boss-bench-")
+    process = None
+    try:
+        if args.mode == "gunicorn":
+            process, base_url = start_gunicorn(args, work_dir)
+            target = HttpTarget(base_url)
+            io_pids = lambda: [process.pid] + child_pids(process.pid)
+            state = target.get("/get_state")[2]
+            keys = list(state)
+            channels = sorted({key.split("_", 1)[0] for key in keys})
+        else:
+            # server.py zapisuje stan w bieżącym katalogu - importujemy go już w katalogu tymczasowym
+            os.environ["STATE_BACKEND"] = args.backend
+            os.chdir(work_dir)
+            sys.path.insert(0, REPO_DIR)
+            import logging
+            import server
+            # Logi mutacji na stderr zawyżałyby liczbę zapisów procesu
+            logging.getLogger().setLevel(logging.WARNING)
+            target = TestClientTarget(server.app)
+            io_pids = lambda: [os.getpid()]
+            keys = list(server.LAYOUT.keys)
+            channels = list(server.CHANNELS)
+
+        recorder = Recorder()
+        mutations = []
+        stop = threading.Event()
+        threads = [threading.Thread(target=poller, args=(target, recorder, stop, args.poll_interval), daemon=True)
+                   for _ in range(args.clients)]
+        threads += [threading.Thread(target=writer, daemon=True,
+                                     args=(target, recorder, stop, keys, channels, args.burst_size, args.burst_interval, mutations))
+                    for _ in range(args.writers)]
+
+        io_before = read_proc_io(io_pids())
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        io_after = read_proc_io(io_pids())
+
+        disk = None
+        if io_before and io_after and mutations:
+            disk = {f"{name}_per_mutation": round((io_after[name] - io_before[name]) / len(mutations), 2)
+                    for name in io_before}
+        return {
+            "meta": {
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "duration_s": round(elapsed, 3),
+            "mutations": len(mutations),
+            "endpoints": summarize(recorder, elapsed),
+            "disk": disk,
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API trackera bossów.")
+    parser.add_argument("--mode", choices=("testclient", "gunicorn"), default="testclient")
+    parser.add_argument("--backend", choices=("journal", "sqlite"), default="journal", help="STATE_BACKEND serwera")
+    parser.add_argument("--clients", type=int, default=20, help="liczba klientów odpytujących /changes")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="przerwa między odpytaniami klienta (s, 0 = bez przerwy)")
+    parser.add_argument("--writers", type=int, default=1, help="liczba wątków wysyłających zapisy")
+    parser.add_argument("--burst-size", type=int, default=10, help="liczba zbić w jednej serii (+1 reset kanału)")
+    parser.add_argument("--burst-interval", type=float, default=1.0, help="przerwa między seriami zapisów (s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="czas trwania pomiaru (s)")
+    parser.add_argument("--workers", type=int, default=1, help="workery gunicorna (tryb gunicorn)")
+    parser.add_argument("--threads", type=int, default=50, help="wątki na workera gunicorna (tryb gunicorn)")
+    parser.add_argument("--output", help="plik JSON z wynikiem")
+    parser.add_argument("--compare", help="poprzedni wynik JSON do porównania")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="dopuszczalne pogorszenie względem --compare (0.2 = 20%%), powyżej kod wyjścia 1")
+    args = parser.parse_args()
+    if args.mode == "gunicorn" and args.workers > 1 and args.backend == "journal":
+        parser.error("backend journal trzyma stan w pamięci procesu - dla --workers > 1 użyj --backend sqlite")
+
+    result = run(args)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare and compare(result, args.compare, args.max_regression):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,59 @@
 import tkinter as tk
 from tkinter import messagebox
+from array import array
 from datetime import datetime, timedelta
 import json
+import math
 import os
-import requests
-from PIL import Image, ImageDraw, ImageFont, ImageTk
+import queue
+import random
+import threading
+import time
+# requests (~0.1 s importu) i PIL są importowane leniwie, żeby nie opóźniać pierwszego okna:
+# requests w wątkach sieciowych (create_http_session), PIL po pierwszej klatce (obrazki przycisków RESET)
+requests = None
 
 # --- KONFIGURACJA SERWERA ---
+# Przestrzeń (gildia) na współdzielonym serwerze: dopisz "/t/<nazwa>" - konfiguracja kanałów i bossów musi odpowiadać /t/<nazwa>/config
 SERVER_URL = "https://boss-tracker-api.onrender.com"
 
-# Co ile milisekund odpytywać SERWER o nowe dane (np. 3 sekundy)
+# Co ile milisekund odpytywać SERWER o nowe dane (np. 3 sekundy), gdy okno jest aktywne
+# i któryś boss zaraz się odrodzi. Pozostałe przerwy dobiera _next_poll_delay_ms.
 UPDATE_SERVER_INTERVAL_MS = 3000
-
-# Co ile milisekund odświeżać LOKALNE GUI (np. 1 sekundę)
-UPDATE_UI_INTERVAL_MS = 1000
+# Przez tyle sekund po zmianie (naszej albo cudzej) odpytujemy częściej - zwykle idą kolejne
+POLL_FAST_AFTER_CHANGE_S = 20
+POLL_INTERVAL_FAST_MS = 1000
+# Okno nieaktywne albo żaden boss nie odradza się w ciągu POLL_RESPAWN_SOON_S
+POLL_INTERVAL_IDLE_MS = 15000
+POLL_RESPAWN_SOON_S = 120
+# Okno zminimalizowane
+POLL_INTERVAL_HIDDEN_MS = 60000
+# Po błędach przerwa rośnie wykładniczo do tego limitu
+POLL_BACKOFF_MAX_MS = 120000
+# Losowe rozrzucenie przerw (+-20%), aby klienci nie odpytywali serwera w tej samej fazie
+POLL_JITTER = 0.2
+
+# LOKALNE GUI odświeżamy dokładnie wtedy, gdy zmienia się tekst najbliższego licznika;
+# to jest tylko górny limit przerwy między odświeżeniami (np. na wypadek zmiany zegara)
+UPDATE_UI_MAX_INTERVAL_MS = 60000
+
+# Kliknięcia "Zbij" z tego okna czasu są wysyłane razem jednym żądaniem /batch_update
+KILL_BATCH_WINDOW_MS = 250
+# Najwięcej zmian z kolejki wysyłanych jednym /batch_update (limit serwera to 200 operacji)
+OUTBOX_BATCH_MAX = 200
+# Ponowne wysyłanie kolejki bez połączenia - przerwa rośnie wykładniczo do maksimum
+OUTBOX_RETRY_MIN_MS = 2000
+OUTBOX_RETRY_MAX_MS = 60000
+# Zapis lokalnej kopii stanu serwera najwyżej raz na tyle milisekund (kolejne zmiany są grupowane)
+LOCAL_STATE_SAVE_DELAY_MS = 2000
+
+# Tryb push: zamiast odpytywać co UPDATE_SERVER_INTERVAL_MS, wątek w tle trzyma long-poll
+# na /wait_for_change i dostaje zmiany zaraz po ich zapisaniu na serwerze
+USE_PUSH_UPDATES = True
+LONG_POLL_TIMEOUT_S = 25
+# Opóźnienie ponownego połączenia po zerwaniu long-polla (rośnie do maksimum przy kolejnych błędach)
+PUSH_RECONNECT_MIN_S = 1
+PUSH_RECONNECT_MAX_S = 30
 
 # Konfiguracja bossów (teraz jako lista krotek, aby zachować kolejność)
 BOSS_ORDERED_LIST = [
@@ -28,6 +68,58 @@ BOSS_CONFIG = {name: time for name, time in BOSS_ORDERED_LIST}
 
 CHANNELS = ["CH1", "CH2", "CH3", "CH4", "CH5", "CH6"]
 BOSS_STATE_FILE = "boss_state.json"
+# Trwała kolejka zmian z kliknięć, jeszcze niepotwierdzonych przez serwer (linia JSON na zmianę)
+OUTBOX_FILE = "boss_outbox.jsonl"
+
+# --- Zwarta reprezentacja stanu ---
+# Boss na kanale ma stały slot = indeks_kanału * liczba_bossów + indeks_bossa. Czasy zabicia
+# trzymamy w tablicy sekund epoki (NaN = brak zabicia), a klucze "CH_BOSS" i napisy ISO
+# występują tylko przy wymianie danych z serwerem i plikiem lokalnym.
+NO_KILL = math.nan
+SLOT_KEYS = [f"{ch}_{boss_name}" for ch in CHANNELS for boss_name, _ in BOSS_ORDERED_LIST]
+KEY_SLOTS = {key: slot for slot, key in enumerate(SLOT_KEYS)}
+# Czas respawnu (w sekundach) dla każdego slotu
+SLOT_RESPAWN_S = array('d', [minutes * 60 for _ in CHANNELS for _, minutes in BOSS_ORDERED_LIST])
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+def iso_to_epoch(timestamp):
+    """ISO 8601 (czas lokalny bez strefy, jak z datetime.now()) -> sekundy epoki; None -> NO_KILL."""
+    if timestamp is None:
+        return NO_KILL
+    return (datetime.fromisoformat(timestamp) - _EPOCH) / _SECOND
+
+def epoch_to_iso(seconds):
+    """Odwrotność iso_to_epoch."""
+    if math.isnan(seconds):
+        return None
+    return (_EPOCH + timedelta(microseconds=round(seconds * 1_000_000))).isoformat()
+
+def now_epoch():
+    """Bieżący czas lokalny w tej samej skali co iso_to_epoch."""
+    return (datetime.now() - _EPOCH) / _SECOND
+
+def times_from_dict(state):
+    """Słownik {klucz: ISO albo None} -> tablica czasów zabicia (nieznane klucze i złe wartości pomijane)."""
+    times = array('d', [NO_KILL]) * len(SLOT_KEYS)
+    for key, timestamp in state.items():
+        slot = KEY_SLOTS.get(key)
+        if slot is None:
+            continue
+        try:
+            times[slot] = iso_to_epoch(timestamp)
+        except (TypeError, ValueError):
+            print(f"Ostrzeżenie: Nieprawidłowy czas dla klucza '{key}': {timestamp}")
+    return times
+
+def times_to_dict(times):
+    """Tablica czasów zabicia -> słownik {klucz: ISO albo None} (format serwera i pliku lokalnego)."""
+    return {key: epoch_to_iso(seconds) for key, seconds in zip(SLOT_KEYS, times)}
+
+def same_time(a, b):
+    """Porównanie czasów, w którym NO_KILL jest równe NO_KILL."""
+    return a == b or (math.isnan(a) and math.isnan(b))
 
 # --- Paleta kolorów dla Dark Mode ---
 colors = {
@@ -62,13 +154,136 @@ def load_local_boss_state():
         return {}
 
 def save_local_boss_state(state):
-    """Zapisuje bieżący stan bossów do lokalnego pliku JSON."""
+    """Zapisuje bieżący stan bossów do lokalnego pliku JSON (przez plik tymczasowy - bez uciętego pliku po awarii)."""
+    tmp_path = f"{BOSS_STATE_FILE}.tmp"
     try:
-        with open(BOSS_STATE_FILE, 'w') as f:
+        with open(tmp_path, 'w') as f:
             json.dump(state, f, indent=4)
+        os.replace(tmp_path, BOSS_STATE_FILE)
     except IOError as e:
         print(f"Błąd zapisu lokalnego stanu do {BOSS_STATE_FILE}: {e}")
 
+def load_outbox():
+    """Ładuje niewysłane zmiany z OUTBOX_FILE, pomijając uszkodzone linie (np. przerwany zapis)."""
+    entries = []
+    try:
+        with open(OUTBOX_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if entry["key"] in KEY_SLOTS:
+                        iso_to_epoch(entry["timestamp"])
+                        iso_to_epoch(entry["changed_at"])
+                        iso_to_epoch(entry.get("expected"))
+                        entries.append(entry)
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    print(f"Pomijam uszkodzony wpis kolejki {OUTBOX_FILE}: {line.strip()}")
+    except FileNotFoundError:
+        pass
+    except IOError as e:
+        print(f"Błąd odczytu kolejki zmian ({OUTBOX_FILE}): {e}")
+    return entries
+
+def append_outbox(entries):
+    """Dopisuje zmiany do kolejki z fsync - kliknięcie przetrwa zamknięcie programu i awarię."""
+    try:
+        with open(OUTBOX_FILE, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+    except IOError as e:
+        print(f"Błąd zapisu kolejki zmian do {OUTBOX_FILE}: {e}")
+
+def rewrite_outbox(entries):
+    """Zastępuje kolejkę pozostałymi zmianami (atomowo, przez plik tymczasowy)."""
+    tmp_path = f"{OUTBOX_FILE}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, OUTBOX_FILE)
+    except IOError as e:
+        print(f"Błąd zapisu kolejki zmian do {OUTBOX_FILE}: {e}")
+
+def outbox_entry_needed(entry, current_seconds):
+    """Czy zmiana z kolejki jest nadal potrzebna, gdy klucz ma na serwerze wartość `current_seconds`.
+
+    Zabicie wygrywa, jeśli jest nowsze od zabicia na serwerze (ostatni czas zabicia to aktualny
+    stan bossa) albo serwer ma wartość widzianą przed kliknięciem ("expected") lub żadną. Starsze
+    zabicie przepada, gdy w międzyczasie ktoś zgłosił inne. Odznaczenie dotyczy zabicia widzianego
+    przed kliknięciem i przepada, jeśli serwer ma już inne zabicie (ktoś zbił bossa ponownie) albo żadne.
+    """
+    target = iso_to_epoch(entry["timestamp"])
+    if same_time(current_seconds, target):
+        return False
+    expected = iso_to_epoch(entry.get("expected"))
+    if math.isnan(target):
+        return same_time(current_seconds, expected)
+    return math.isnan(current_seconds) or target > current_seconds or same_time(current_seconds, expected)
+
+# --- SIEĆ W TLE (żądania HTTP poza wątkiem Tk) ---
+def create_http_session():
+    """Tworzy sesję HTTP z pulą połączeń keep-alive (bez nowego handshake TLS przy każdym żądaniu).
+
+    Wywoływane w wątkach sieciowych - przy okazji importuje tam requests. Błędy sieci obsługiwane
+    w wątku Tk mogą więc używać `requests.exceptions`, bo pojawiają się dopiero po utworzeniu sesji.
+    """
+    global requests
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept"] = "application/json"
+    # Serwer wysyła skompresowane odpowiedzi odczytu (requests rozpakowuje je sam)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+class ServerConflict(Exception):
+    """Serwer odrzucił zmianę z warunkiem compare-and-set (409); `data` zawiera bieżące wartości spornych kluczy."""
+
+    def __init__(self, data):
+        super().__init__(data.get("message"))
+        self.data = data
+
+class NetworkWorker:
+    """Wątek w tle wykonujący kolejno zlecone żądania na jednej trwałej sesji HTTP.
+
+    Zadanie to funkcja przyjmująca sesję; jej wynik (albo wyjątek) jest przekazywany
+    do wątku Tk przez after_idle, więc okno nie zamarza w trakcie żądań.
+    """
+
+    def __init__(self, ui):
+        self.ui = ui
+        # Sesja powstaje już w wątku sieciowym (import requests nie blokuje startu okna)
+        self.session = None
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="network-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, job, on_success=None, on_error=None):
+        """Kolejkuje job(session). on_success(wynik) / on_error(wyjątek) wywołane w wątku Tk."""
+        self._jobs.put((job, on_success, on_error))
+
+    def _run(self):
+        self.session = create_http_session()
+        while True:
+            job, on_success, on_error = self._jobs.get()
+            try:
+                result = job(self.session)
+            except Exception as e:
+                callback, arg = on_error, e
+            else:
+                callback, arg = on_success, result
+            if callback is None:
+                continue
+            try:
+                self.ui.after_idle(callback, arg)
+            except (RuntimeError, tk.TclError):
+                return # Okno zostało zamknięte
+
 # --- KLASA APLIKACJI TKINTER ---
 class BossTrackerApp(tk.Tk):
     def __init__(self):
@@ -78,18 +293,78 @@ class BossTrackerApp(tk.Tk):
         self.resizable(True, True) 
         self.configure(bg=colors['bg'])
 
-        self.reset_button_images = {}
-        self.state = load_local_boss_state()
-        self.labels = {}
+        # Obrazki z pionowym tekstem (np. "RESET") - każdy różny renderowany raz i współdzielony przez przyciski
+        self.vertical_text_images = {}
+        # Ostatni znany stan serwera; kill_times to on z nałożonymi zmianami z kolejki (to widać w oknie)
+        self.server_times = times_from_dict(load_local_boss_state())
+        self.kill_times = array('d', self.server_times)
+        # Czas respawnu (sekundy epoki) dla każdego slotu, przeliczany tylko przy zmianie kill_times
+        self.respawn_times = self._compute_respawn_times(self.kill_times)
+        # Wersja i ETag ostatnio zsynchronizowanego stanu - /changes odsyła tylko nowsze zmiany,
+        # a 304, jeśli nic się nie zmieniło
+        self.state_boot = None
+        self.state_version = 0
+        self.state_etag = None
+        # Zmiany z kliknięć czekające na potwierdzenie serwera - w pamięci i w OUTBOX_FILE
+        self.outbox = load_outbox()
+        self._outbox_next_id = max((entry["id"] for entry in self.outbox), default=0) + 1
+        self._outbox_flush_job = None
+        # id ostatniej zmiany w wysłanym, jeszcze niepotwierdzonym batchu
+        self._outbox_sending = None
+        self._outbox_failures = 0
+        self._local_save_job = None
+        for entry in self.outbox:
+            self.kill_times[KEY_SLOTS[entry["key"]]] = iso_to_epoch(entry["timestamp"])
+        # Stan harmonogramu odpytywania (tryb bez push)
+        self._poll_job = None
+        self._poll_due = 0.0
+        self._poll_in_flight = False
+        self._poll_failures = 0
+        self._fast_poll_until = 0.0
+        # Etykiety statusu indeksowane slotem
+        self.labels = [None] * len(SLOT_KEYS)
+        # Ostatnio wyświetlone (tekst, tło, kolor tekstu) każdej etykiety - niezmienione pomijamy
+        self._rendered = [None] * len(SLOT_KEYS)
+        self._ui_refresh_job = None
+        self.reset_buttons = []
         self.create_ui()
+        # Import PIL i renderowanie obrazka dopiero po narysowaniu pierwszej klatki okna
+        self.after_idle(self._load_reset_button_images)
 
         self.connection_status_label = tk.Label(self, text="Status: Łączenie z serwerem...", font=("Segoe UI", 9), bg=colors['bg'], fg="blue")
         self.connection_status_label.grid(row=len(CHANNELS) + 2, column=0, columnspan=len(BOSS_ORDERED_LIST) * 2 + 1, pady=5, sticky="w", padx=10)
 
-        self.fetch_data_from_server()
+        self.network = NetworkWorker(self)
+        # Okno z lokalnie zapisanym stanem jest gotowe od razu; sieć (razem z importem requests i pierwszym
+        # połączeniem) rusza w wątkach w tle po wejściu w mainloop, aby after_idle z innych wątków było bezpieczne.
+        # W trybie push pierwsza odpowiedź long-polla (since=0) jest od razu pełnym snapshotem.
+        if USE_PUSH_UPDATES:
+            self.after_idle(self.start_push_listener)
+        else:
+            self.after_idle(self.fetch_data_from_server)
+            # Po powrocie do okna nie czekamy na długą przerwę z czasu bezczynności
+            self.bind("<FocusIn>", lambda event: self._poll_sooner(UPDATE_SERVER_INTERVAL_MS), add="+")
+        # Zmiany niewysłane przed poprzednim zamknięciem programu
+        if self.outbox:
+            self.after_idle(self._flush_outbox)
         self.update_statuses_ui()
 
+    def vertical_text_image(self, text, font_size=10, font_name="Segoe UI Bold", text_color=colors['reset_button_fg'], bg_color=colors['reset_button_bg']):
+        """Zwraca obrazek z pionowym tekstem, renderując go tylko przy pierwszym użyciu danych parametrów."""
+        cache_key = (text, font_size, font_name, text_color, bg_color)
+        image = self.vertical_text_images.get(cache_key)
+        if image is None:
+            image = self.vertical_text_images[cache_key] = self.create_vertical_text_image(*cache_key)
+        return image
+
+    def _load_reset_button_images(self):
+        """Zastępuje tymczasowy napis przycisków RESET obrazkiem z pionowym tekstem."""
+        image = self.vertical_text_image("RESET")
+        for button in self.reset_buttons:
+            button.config(image=image, text="")
+
     def create_vertical_text_image(self, text, font_size=10, font_name="Segoe UI Bold", text_color=colors['reset_button_fg'], bg_color=colors['reset_button_bg']):
+        from PIL import Image, ImageDraw, ImageFont, ImageTk
         try:
             font = ImageFont.truetype(font_name, font_size)
         except IOError:
@@ -210,20 +485,20 @@ class BossTrackerApp(tk.Tk):
                                  padx=8, pady=4) 
                 label.grid(row=0, column=1, sticky="nsew", padx=2, pady=2) 
 
-                self.labels[key] = label
+                self.labels[KEY_SLOTS[key]] = label
                 current_boss_column_index += 1
             
-            reset_text = "RESET"
-            self.reset_button_images[ch] = self.create_vertical_text_image(reset_text)
-
+            # Pionowy napis jako tekst do czasu, aż _load_reset_button_images podmieni go na obrazek
             reset_btn = tk.Button(self,
-                                  image=self.reset_button_images[ch],
+                                  text="\n".join("RESET"),
+                                  font=("Segoe UI", 7, "bold"),
                                   compound="center",
                                   command=lambda ch_name=ch: self.reset_channel(ch_name),
                                   bg=colors['reset_button_bg'],
                                   fg=colors['reset_button_fg'],
                                   relief=tk.FLAT, borderwidth=0)
             reset_btn.grid(row=r_idx + 2, column=len(BOSS_ORDERED_LIST) * 2 + 1, padx=(2, 10), sticky="ns", pady=2)
+            self.reset_buttons.append(reset_btn)
 
         for r_idx in range(len(CHANNELS)):
             self.grid_rowconfigure(r_idx + 2, weight=1) 
@@ -232,125 +507,432 @@ class BossTrackerApp(tk.Tk):
         self.grid_rowconfigure(len(CHANNELS) + 2, weight=0) 
 
 
-    def fetch_data_from_server(self):
-        """Pobiera najnowsze dane o bossach z serwera i aktualizuje self.state."""
-        try:
-            response = requests.get(f"{SERVER_URL}/get_state", timeout=5)
-            response.raise_for_status()
-            new_state = response.json()
-
-            if new_state != self.state:
-                self.state = new_state
-                save_local_boss_state(self.state)
-                self.connection_status_label.config(text="Status: Połączono (dane zaktualizowane)", fg="green")
-            else:
-                self.connection_status_label.config(text="Status: Połączono (brak nowych danych)", fg="gray")
+    def _request_changes(self, session, since, boot, etag=None, endpoint="changes", params=None, timeout=5):
+        """Pobiera zmiany od wersji `since` z /changes lub /wait_for_change.
+
+        Nie dotyka self.kill_times ani widgetów, więc może działać poza wątkiem Tk.
+        Zwraca (dane, etag) albo (None, etag) przy 304 Not Modified.
+        """
+        params = dict(params or {})
+        params["since"] = since
+        if boot:
+            params["boot"] = boot
+        headers = {}
+        if etag:
+            # ETag odsyłany dokładnie tak, jak przyszedł (serwer wysyła słaby ETag W/"...")
+            headers["If-None-Match"] = etag
+        response = session.get(f"{SERVER_URL}/{endpoint}", params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json(), response.headers.get("ETag") or None
+
+    def _changes_job(self):
+        """Zwraca zadanie dla NetworkWorker pobierające zmiany od bieżącej wersji stanu."""
+        since, boot, etag = self.state_version, self.state_boot, self.state_etag
+        return lambda session: self._request_changes(session, since, boot, etag)
+
+    def _apply_changes(self, data, etag):
+        """Nakłada odpowiedź z /changes (lub z endpointu zmieniającego stan) na self.server_times.
+
+        Zwraca True, jeśli zmienił się wyświetlany stan. Gdy serwer nie ma już naszej wersji w dzienniku
+        (albo został zrestartowany), odsyła pełny snapshot, który zastępuje cały stan.
+        """
+        if data is None:
+            return False
 
-        except requests.exceptions.Timeout:
-            self.connection_status_label.config(text="Status: Limit czasu połączenia. Serwer może się budzić...", fg="orange")
-        except requests.exceptions.ConnectionError:
-            self.connection_status_label.config(text="Status: Błąd połączenia (serwer offline?). Próbuję ponownie...", fg="red")
-        except requests.exceptions.RequestException as e:
-            self.connection_status_label.config(text=f"Status: Błąd serwera ({e}). Próbuję ponownie...", fg="red")
-        except json.JSONDecodeError:
-            self.connection_status_label.config(text="Status: Błąd danych z serwera (JSON). Próbuję ponownie...", fg="red")
-        except Exception as e:
-            self.connection_status_label.config(text=f"Status: Nieoczekiwany błąd ({type(e).__name__}: {e}).", fg="red")
-        finally:
-            self.after(UPDATE_SERVER_INTERVAL_MS, self.fetch_data_from_server)
+        # Spóźniona odpowiedź (np. z long-polla) starsza niż to, co już mamy - pomijamy
+        if data.get("boot") == self.state_boot and data.get("version", 0) < self.state_version:
+            return False
 
-    def _load_state_from_server_immediate(self):
+        server_changed = False
+        if data.get("full"):
+            new_times = times_from_dict(data.get("state", {}))
+            server_changed = not all(map(same_time, new_times, self.server_times))
+            self.server_times = new_times
+            in_sequence = True
+        else:
+            for change in data.get("changes", []):
+                slot = KEY_SLOTS.get(change["key"])
+                if slot is None:
+                    continue
+                seconds = iso_to_epoch(change["timestamp"])
+                if not same_time(self.server_times[slot], seconds):
+                    self.server_times[slot] = seconds
+                    server_changed = True
+            # Zmiany nie stykają się z naszą wersją (ominęliśmy czyjeś zmiany pomiędzy) -
+            # wersji nie przesuwamy, żeby następna synchronizacja dociągnęła lukę
+            in_sequence = data.get("boot") == self.state_boot and data.get("since", self.state_version) <= self.state_version
+
+        if in_sequence:
+            self.state_boot = data.get("boot")
+            self.state_version = data.get("version", 0)
+            self.state_etag = etag
+        if not server_changed:
+            return False
+        self._schedule_local_save()
+        return self._reconcile_outbox()
+
+    def _reconcile_outbox(self):
+        """Odrzuca z kolejki zmiany, których intencja jest już spełniona albo nieaktualna, i przelicza wyświetlany stan.
+
+        Zmiany tego samego klucza są oceniane po kolei względem wartości ustawionej przez poprzednie.
+        Warunek "expected" pozostałych zmian to wartość, którą faktycznie zastąpią.
+        Zwraca True, jeśli wyświetlany stan się zmienił.
+        """
+        view = array('d', self.server_times)
+        kept = []
+        rewritten = False
+        for entry in self.outbox:
+            slot = KEY_SLOTS[entry["key"]]
+            if not outbox_entry_needed(entry, view[slot]):
+                continue
+            if "expected" not in entry or not same_time(iso_to_epoch(entry["expected"]), view[slot]):
+                # Np. ktoś wyczyścił bossa, którego zabicie czeka w kolejce - zabicie nadal jest potrzebne
+                entry["expected"] = epoch_to_iso(view[slot])
+                rewritten = True
+            view[slot] = iso_to_epoch(entry["timestamp"])
+            kept.append(entry)
+        if len(kept) != len(self.outbox):
+            print(f"Odrzucono {len(self.outbox) - len(kept)} zmian z kolejki - serwer ma już inne dane.")
+        if rewritten or len(kept) != len(self.outbox):
+            self.outbox = kept
+            rewrite_outbox(kept)
+
+        changed = False
+        for slot, seconds in enumerate(view):
+            if not same_time(self.kill_times[slot], seconds):
+                self.kill_times[slot] = seconds
+                self.respawn_times[slot] = seconds + SLOT_RESPAWN_S[slot]
+                changed = True
+        return changed
+
+    def _schedule_local_save(self):
+        """Zapisuje lokalną kopię stanu serwera z opóźnieniem - seria zmian daje jeden zapis pliku."""
+        if self._local_save_job is None:
+            self._local_save_job = self.after(LOCAL_STATE_SAVE_DELAY_MS, self._save_local_state)
+
+    def _save_local_state(self):
+        self._local_save_job = None
+        save_local_boss_state(times_to_dict(self.server_times))
+
+    def start_push_listener(self):
+        """Uruchamia wątek long-polla, który przekazuje zmiany do wątku Tk przez after_idle."""
+        thread = threading.Thread(target=self._push_listener_loop, name="push-listener", daemon=True)
+        thread.start()
+
+    def _push_listener_loop(self):
+        """Pętla long-polla na /wait_for_change z automatycznym ponownym łączeniem po zerwaniu."""
+        # Long-poll blokuje połączenie na długo, więc ma własną sesję obok NetworkWorker
+        session = create_http_session()
+        since, boot = self.state_version, self.state_boot
+        reconnect_delay = PUSH_RECONNECT_MIN_S
+        reconnecting = False
+        while True:
+            try:
+                data, etag = self._request_changes(
+                    session, since, boot,
+                    endpoint="wait_for_change",
+                    # Po zerwaniu pytamy bez czekania, żeby od razu wiedzieć, że połączenie wróciło
+                    params={"timeout": 0 if reconnecting else LONG_POLL_TIMEOUT_S},
+                    timeout=LONG_POLL_TIMEOUT_S + 10,
+                )
+                since, boot = data.get("version", since), data.get("boot", boot)
+                reconnect_delay = PUSH_RECONNECT_MIN_S
+                if reconnecting or data.get("full") or data.get("changes"):
+                    self._call_in_ui(self._on_push_changes, data, etag)
+                reconnecting = False
+            except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+                if not self._call_in_ui(self._on_push_error, e):
+                    return
+                reconnecting = True
+                # Rozrzucenie w czasie - po restarcie serwera klienci nie łączą się wszyscy naraz
+                time.sleep(reconnect_delay * random.uniform(0.5, 1.0))
+                reconnect_delay = min(reconnect_delay * 2, PUSH_RECONNECT_MAX_S)
+
+    def _call_in_ui(self, callback, *args):
+        """Przekazuje wywołanie do wątku Tk. Zwraca False, jeśli okno zostało już zamknięte."""
         try:
-            response = requests.get(f"{SERVER_URL}/get_state", timeout=5)
-            response.raise_for_status()
-            new_state = response.json()
-            if new_state != self.state:
-                self.state = new_state
-                save_local_boss_state(self.state)
-                self.connection_status_label.config(text="Status: Dane zaktualizowane natychmiast!", fg="darkgreen")
+            self.after_idle(callback, *args)
             return True
-        except requests.exceptions.RequestException as e:
-            print(f"Błąd natychmiastowego pobierania stanu z serwera: {e}")
-            self.connection_status_label.config(text="Status: Błąd natychmiastowej aktualizacji z serwera!", fg="red")
+        except (RuntimeError, tk.TclError):
             return False
 
-    def toggle_kill(self, key):
-        if self.state.get(key):
-            timestamp_to_send = None
+    def _on_push_changes(self, data, etag):
+        if self._apply_changes(data, etag):
+            self.update_statuses_ui()
+        self.connection_status_label.config(text="Status: Połączono (aktualizacje na żywo)", fg="green")
+        self._on_connection_restored()
+
+    def _on_push_error(self, error):
+        if isinstance(error, requests.exceptions.Timeout):
+            self.connection_status_label.config(text="Status: Limit czasu połączenia. Serwer może się budzić...", fg="orange")
         else:
-            timestamp_to_send = datetime.now().isoformat()
+            self.connection_status_label.config(text="Status: Utracono połączenie na żywo. Łączę ponownie...", fg="red")
 
-        payload = {
-            "key": key,
-            "timestamp": timestamp_to_send
-        }
+    def fetch_data_from_server(self):
+        """Zleca pobranie najnowszych danych o bossach; wynik trafia do _on_poll_result."""
+        self._poll_job = None
+        self._poll_in_flight = True
+        self.network.submit(self._changes_job(), on_success=self._on_poll_result, on_error=self._on_poll_error)
+
+    def _schedule_poll(self, delay_ms):
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+        self._poll_due = time.monotonic() + delay_ms / 1000
+        self._poll_job = self.after(delay_ms, self.fetch_data_from_server)
+
+    def _poll_sooner(self, delay_ms):
+        """Przyspiesza zaplanowane odpytanie, jeśli miało nastąpić później niż za `delay_ms`."""
+        if USE_PUSH_UPDATES or self._poll_in_flight or self._poll_failures:
+            return
+        if self._poll_job is None or self._poll_due > time.monotonic() + delay_ms / 1000:
+            self._schedule_poll(delay_ms)
+
+    def _mark_changed(self):
+        """Po zmianie stanu odpytujemy przez chwilę częściej."""
+        self._fast_poll_until = time.monotonic() + POLL_FAST_AFTER_CHANGE_S
+        self._poll_sooner(POLL_INTERVAL_FAST_MS)
+
+    def _next_poll_delay_ms(self):
+        """Przerwa do następnego odpytania: backoff po błędach, a poza tym zależnie od okna i liczników."""
+        if self._poll_failures:
+            backoff = min(UPDATE_SERVER_INTERVAL_MS * 2 ** self._poll_failures, POLL_BACKOFF_MAX_MS)
+            return int(random.uniform(backoff / 2, backoff))
+        if self.state() == "iconic":
+            interval = POLL_INTERVAL_HIDDEN_MS
+        elif time.monotonic() < self._fast_poll_until:
+            interval = POLL_INTERVAL_FAST_MS
+        elif not self._has_focus() or not self._respawn_soon():
+            interval = POLL_INTERVAL_IDLE_MS
+        else:
+            interval = UPDATE_SERVER_INTERVAL_MS
+        return int(interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER))
 
+    def _has_focus(self):
+        """Czy okno aplikacji ma fokus (focus_get potrafi rzucić KeyError dla niektórych widżetów Tk)."""
         try:
-            response = requests.post(f"{SERVER_URL}/update_boss_status", json=payload, timeout=5)
-            response.raise_for_status()
-            
-            self._load_state_from_server_immediate()
+            return self.focus_get() is not None
+        except KeyError:
+            return True
+
+    def _respawn_soon(self):
+        """Czy któryś boss odrodzi się w ciągu POLL_RESPAWN_SOON_S."""
+        now = now_epoch()
+        return any(0 < respawn_at - now <= POLL_RESPAWN_SOON_S for respawn_at in self.respawn_times)
+
+    def _on_poll_result(self, result):
+        self._poll_in_flight = False
+        self._poll_failures = 0
+        self._on_connection_restored()
+        first_sync = self.state_version == 0
+        if self._apply_changes(*result):
             self.update_statuses_ui()
-        except requests.exceptions.Timeout:
-            messagebox.showerror("Błąd", f"Nie udało się zaktualizować statusu bossa {key}: Przekroczono limit czasu serwera.")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Błąd aktualizacji", f"Nie udało się zaktualizować statusu bossa na serwerze: {e}")
-        except Exception as e:
-            messagebox.showerror("Błąd", f"Nieoczekiwany błąd podczas aktualizacji statusu: {e}")
+            # Pierwsza synchronizacja po starcie to nie świeża zmiana - nie przyspieszamy
+            if not first_sync:
+                self._fast_poll_until = time.monotonic() + POLL_FAST_AFTER_CHANGE_S
+            self.connection_status_label.config(text="Status: Połączono (dane zaktualizowane)", fg="green")
+        else:
+            self.connection_status_label.config(text="Status: Połączono (brak nowych danych)", fg="gray")
+        # Kolejne odpytanie planujemy dopiero po odpowiedzi, aby żądania się nie nawarstwiały
+        self._schedule_poll(self._next_poll_delay_ms())
+
+    def _on_poll_error(self, error):
+        if isinstance(error, requests.exceptions.Timeout):
+            self.connection_status_label.config(text="Status: Limit czasu połączenia. Serwer może się budzić...", fg="orange")
+        elif isinstance(error, requests.exceptions.ConnectionError):
+            self.connection_status_label.config(text="Status: Błąd połączenia (serwer offline?). Próbuję ponownie...", fg="red")
+        elif isinstance(error, requests.exceptions.RequestException):
+            self.connection_status_label.config(text=f"Status: Błąd serwera ({error}). Próbuję ponownie...", fg="red")
+        elif isinstance(error, json.JSONDecodeError):
+            self.connection_status_label.config(text="Status: Błąd danych z serwera (JSON). Próbuję ponownie...", fg="red")
+        else:
+            self.connection_status_label.config(text=f"Status: Nieoczekiwany błąd ({type(error).__name__}: {error}).", fg="red")
+        self._poll_in_flight = False
+        self._poll_failures += 1
+        self._schedule_poll(self._next_poll_delay_ms())
+
+    def _mutation_job(self, path, payload=None):
+        """Zadanie: POST zmieniający stan. Serwer odsyła nową wersję i zmienione wpisy,
+        więc jeden round-trip wystarcza (bez dodatkowego GET)."""
+        def job(session):
+            response = session.post(f"{SERVER_URL}/{path}", json=payload, timeout=5)
+            if response.status_code == 409:
+                raise ServerConflict(response.json())
+            response.raise_for_status()
+            return response.json(), response.headers.get("ETag") or None
+        return job
+
+    def toggle_kill(self, key):
+        # Stan w oknie zawiera już niewysłane kliknięcia, więc podwójne kliknięcie cofa zmianę
+        now = datetime.now().isoformat()
+        killed = not math.isnan(self.kill_times[KEY_SLOTS[key]])
+        self._queue_changes([(key, None if killed else now)], now)
 
     def reset_channel(self, channel):
         if messagebox.askyesno("Potwierdzenie", f"Na pewno zresetować wszystkie dane dla kanału {channel}?"):
-            try:
-                response = requests.post(f"{SERVER_URL}/reset_channel/{channel}", timeout=5)
-                response.raise_for_status()
+            self._queue_changes([(f"{channel}_{boss_name}", None) for boss_name, _ in BOSS_ORDERED_LIST],
+                                datetime.now().isoformat())
+
+    def _queue_changes(self, changes, changed_at):
+        """Nakłada zmiany od razu w oknie i zapisuje je w trwałej kolejce do wysłania na serwer.
+
+        Każda zmiana pamięta wartość widzianą przed kliknięciem ("expected") - serwer zapisze ją tylko,
+        jeśli nikt jej w międzyczasie nie zmienił (compare-and-set).
+        """
+        entries = []
+        for key, timestamp in changes:
+            slot = KEY_SLOTS[key]
+            entries.append({"id": self._outbox_next_id, "key": key, "timestamp": timestamp, "changed_at": changed_at,
+                            "expected": epoch_to_iso(self.kill_times[slot])})
+            self._outbox_next_id += 1
+            self.kill_times[slot] = iso_to_epoch(timestamp)
+            self.respawn_times[slot] = self.kill_times[slot] + SLOT_RESPAWN_S[slot]
+        append_outbox(entries)
+        self.outbox.extend(entries)
+        self.update_statuses_ui()
+        self._schedule_outbox_flush(KILL_BATCH_WINDOW_MS)
+
+    def _schedule_outbox_flush(self, delay_ms):
+        """Planuje wysłanie kolejki; wcześniejszy termin zastępuje późniejszy (np. ponowienie po błędzie)."""
+        if self._outbox_flush_job is not None:
+            if delay_ms >= KILL_BATCH_WINDOW_MS and not self._outbox_failures:
+                return # Wysłanie już zaplanowane w oknie grupowania kliknięć
+            self.after_cancel(self._outbox_flush_job)
+        self._outbox_flush_job = self.after(delay_ms, self._flush_outbox)
+
+    def _flush_outbox(self):
+        """Wysyła najstarsze zmiany z kolejki jednym żądaniem /batch_update (najwyżej jedno naraz)."""
+        self._outbox_flush_job = None
+        if self._outbox_sending is not None or not self.outbox:
+            return
+        batch = self.outbox[:OUTBOX_BATCH_MAX]
+        self._outbox_sending = batch[-1]["id"]
+        operations = []
+        for entry in batch:
+            operation = {"key": entry["key"], "timestamp": entry["timestamp"]}
+            if "expected" in entry:
+                operation["expected"] = entry["expected"]
+            operations.append(operation)
+        self.network.submit(
+            self._mutation_job("batch_update", {"operations": operations}),
+            on_success=self._on_outbox_flushed,
+            on_error=self._on_outbox_error,
+        )
+
+    def _drop_sent_outbox(self):
+        sent, self._outbox_sending = self._outbox_sending, None
+        self.outbox = [entry for entry in self.outbox if entry["id"] > sent]
+        rewrite_outbox(self.outbox)
+
+    def _on_outbox_flushed(self, result):
+        """Serwer przyjął wysłane zmiany - usuwamy je z kolejki i nakładamy odesłany stan."""
+        self._drop_sent_outbox()
+        self._outbox_failures = 0
+        self._mark_changed()
+        self._apply_changes(*result)
+        self.update_statuses_ui()
+        self.connection_status_label.config(text="Status: Dane zaktualizowane natychmiast!", fg="darkgreen")
+        if self.outbox:
+            self._schedule_outbox_flush(0)
+
+    def _on_outbox_error(self, error):
+        if isinstance(error, ServerConflict):
+            self._on_outbox_conflict(error.data)
+            return
+        response = getattr(error, "response", None)
+        if response is not None and 400 <= response.status_code < 500:
+            # Serwer odrzucił zmiany - ponawianie nic nie da, wracamy do jego stanu
+            self._drop_sent_outbox()
+            self._reconcile_outbox()
+            self.update_statuses_ui()
+            messagebox.showerror("Błąd aktualizacji", f"Serwer odrzucił zmiany: {error}")
+            return
+        # Brak połączenia albo błąd serwera - zmiany zostają w kolejce i zostaną wysłane ponownie
+        self._outbox_sending = None
+        self._outbox_failures += 1
+        delay = min(OUTBOX_RETRY_MIN_MS * 2 ** (self._outbox_failures - 1), OUTBOX_RETRY_MAX_MS)
+        self._schedule_outbox_flush(int(random.uniform(delay / 2, delay)))
+        self.connection_status_label.config(
+            text=f"Status: Offline - {len(self.outbox)} zmian czeka na wysłanie. Próbuję ponownie...", fg="orange")
+
+    def _on_outbox_conflict(self, data):
+        """Ktoś zmienił te same klucze przed nami - nakładamy odesłane bieżące wartości i rozstrzygamy kolejkę.
+
+        Zmiana jest wysyłana ponownie (z bieżącą wartością jako nowym warunkiem) tylko, jeśli jej
+        intencja jest nadal niespełniona - patrz outbox_entry_needed.
+        """
+        self._outbox_sending = None
+        for conflict in data.get("conflicts", []):
+            slot = KEY_SLOTS.get(conflict["key"])
+            if slot is not None:
+                self.server_times[slot] = iso_to_epoch(conflict["timestamp"])
+        self._schedule_local_save()
+        self._reconcile_outbox()
+        self.update_statuses_ui()
+        if self.outbox:
+            self._schedule_outbox_flush(0)
 
-                self._load_state_from_server_immediate()
-                self.update_statuses_ui()
+    def _on_connection_restored(self):
+        """Serwer znów odpowiada - kolejkę wysyłamy od razu, bez czekania na ponowienie."""
+        if self.outbox and self._outbox_sending is None:
+            self._outbox_failures = 0
+            self._schedule_outbox_flush(0)
 
-                messagebox.showinfo("Sukces", f"Kanał {channel} został zresetowany na serwerze.")
-            except requests.exceptions.Timeout:
-                messagebox.showerror("Błąd", f"Nie udało się zresetować kanału {channel}: Przekroczono limit czasu serwera.")
-            except requests.exceptions.RequestException as e:
-                messagebox.showerror("Błąd resetowania", f"Nie udało się zresetować kanału na serwerze: {e}")
-            except Exception as e:
-                messagebox.showerror("Błąd", f"Nieoczekiwany błąd podczas resetowania kanału: {e}")
+    @staticmethod
+    def _compute_respawn_times(kill_times):
+        """Czas respawnu dla każdego slotu (NaN propaguje się dla bossów bez zabicia)."""
+        return array('d', map(float.__add__, kill_times, SLOT_RESPAWN_S))
 
     def update_statuses_ui(self):
-        """Aktualizuje statusy bossów w interfejsie użytkownika na podstawie self.state (lokalnego)."""
-        now = datetime.now()
-        for ch in CHANNELS:
-            for boss_name, minutes in BOSS_ORDERED_LIST:
-                key = f"{ch}_{boss_name}"
-                last_kill_timestamp = self.state.get(key)
-
-                label = self.labels.get(key)
-
-                if not label:
-                    print(f"Ostrzeżenie: Etykieta dla klucza '{key}' nie została znaleziona w UI.")
-                    continue
-
-                if last_kill_timestamp:
-                    try:
-                        killed_at = datetime.fromisoformat(last_kill_timestamp)
-                        respawn_time = killed_at + timedelta(minutes=minutes)
-                        remaining = (respawn_time - now).total_seconds()
-
-                        if remaining <= 0:
-                            label.config(text="🟢 Aktywny", bg=colors['active'], fg='white')
-                        elif remaining > 5:
-                            mins = int(remaining // 60)
-                            label.config(text=f"🔴 {mins} min", bg=colors['respawn_later'], fg='white')
-                        else:
-                            mins = int(remaining // 60)
-                            secs = int(remaining % 60)
-                            label.config(text=f"🔴 {mins}:{secs:02}", bg=colors['respawn_soon'], fg='white')
-                            
-                    except ValueError:
-                        label.config(text="Błąd czasu", bg=colors['unknown'], fg='red')
+        """Odświeża statusy i planuje następne odświeżenie na moment zmiany najbliższego licznika.
+
+        Wywoływane też po każdej zmianie stanu - poprzednio zaplanowane odświeżenie jest wtedy anulowane.
+        """
+        if self._ui_refresh_job is not None:
+            self.after_cancel(self._ui_refresh_job)
+        next_change_s = self.refresh_statuses()
+        delay_ms = UPDATE_UI_MAX_INTERVAL_MS
+        if next_change_s < math.inf:
+            # +1 ms, żeby trafić już po granicy, na której zmienia się tekst
+            delay_ms = min(int(next_change_s * 1000) + 1, UPDATE_UI_MAX_INTERVAL_MS)
+        self._ui_refresh_job = self.after(delay_ms, self.update_statuses_ui)
+
+    def refresh_statuses(self):
+        """Aktualizuje etykiety, których wyświetlany status się zmienił.
+
+        Zwraca liczbę sekund do najbliższej zmiany tekstu któregokolwiek licznika (inf, jeśli żaden nie odlicza).
+        """
+        now = now_epoch()
+        next_change_s = math.inf
+        for slot, respawn_at in enumerate(self.respawn_times):
+            if math.isnan(respawn_at):
+                view = ("❓ Nieznany", colors['unknown'], 'white')
+            else:
+                remaining = respawn_at - now
+                if remaining <= 0:
+                    view = ("🟢 Aktywny", colors['active'], 'white')
+                elif remaining > 5:
+                    mins = int(remaining // 60)
+                    view = (f"🔴 {mins} min", colors['respawn_later'], 'white')
+                    # Tekst zmieni się po spadku poniżej pełnej minuty albo przy przejściu w odliczanie sekund
+                    next_change_s = min(next_change_s, remaining - max(mins * 60, 5))
                 else:
-                    label.config(text="❓ Nieznany", bg=colors['unknown'], fg='white')
-
-        self.after(UPDATE_UI_INTERVAL_MS, self.update_statuses_ui)
+                    mins = int(remaining // 60)
+                    secs = int(remaining % 60)
+                    view = (f"🔴 {mins}:{secs:02}", colors['respawn_soon'], 'white')
+                    next_change_s = min(next_change_s, remaining - math.floor(remaining))
+
+            if view == self._rendered[slot]:
+                continue
+            label = self.labels[slot]
+            if not label:
+                print(f"Ostrzeżenie: Etykieta dla klucza '{SLOT_KEYS[slot]}' nie została znaleziona w UI.")
+                continue
+            text, bg, fg = view
+            label.config(text=text, bg=bg, fg=fg)
+            self._rendered[slot] = view
+        return next_change_s
 
 if __name__ == "__main__":
     app = BossTrackerApp()
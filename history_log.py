@@ -0,0 +1,165 @@
+"""Dziennik historii zabić - binarny plik dopisywany na końcu, o rekordach stałej długości.
+
+Magazyn stanu trzyma tylko ostatni czas zabicia każdego slotu, a tu trafia każda zmiana, więc
+da się sprawdzić rzeczywiste czasy respawnu i aktywność kanałów. Rekord (RECORD_SIZE bajtów,
+little-endian) to: czas zapisu na serwerze, czas zabicia (NaN przy czyszczeniu), indeks kanału,
+indeks bossa i akcja. Indeksy odnoszą się do StateLayout przestrzeni - kolejność kanałów i bossów
+w konfiguracji nie może się zmieniać.
+
+Czas zapisu rośnie wraz z pozycją w pliku, więc okno czasowe to wyszukiwanie binarne, a
+agregacje czytają przez mmap tylko rekordy z okna, strumieniowo (bez list obiektów Pythona).
+Dopisywanie to jeden os.write z O_APPEND - kilka workerów może pisać do tego samego pliku.
+"""
+import bisect
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import Counter
+
+from state_store import now_epoch
+
+# czas zapisu (s epoki), czas zabicia (s epoki), kanał, boss, akcja + wyrównanie do 24 bajtów
+RECORD = struct.Struct("<ddHHB3x")
+RECORD_SIZE = RECORD.size
+_RECORDED_AT = struct.Struct("<d")
+
+ACTION_KILL = 1
+ACTION_CLEAR = 2
+
+
+def _ignore_persist_timing(operation, seconds):
+    pass
+
+
+def percentile(sorted_values, fraction):
+    """Percentyl (interpolacja liniowa) posortowanej, niepustej sekwencji."""
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class _RecordedAtColumn:
+    """Czasy zapisu rekordów zmapowanego pliku jako sekwencja dla bisect - bez wczytywania rekordów."""
+
+    def __init__(self, mapped, count):
+        self.mapped = mapped
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return _RECORDED_AT.unpack_from(self.mapped, index * RECORD_SIZE)[0]
+
+
+class HistoryLog:
+    """Dopisywanie zmian stanu do pliku historii i zapytania o okna czasowe.
+
+    `persist_observer(operacja, sekundy)` dostaje czas każdego zapisu ("history").
+    """
+
+    def __init__(self, layout, path, persist_observer=None):
+        self.layout = layout
+        self.path = path
+        self.persist_observer = persist_observer or _ignore_persist_timing
+        self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        # Niepełny rekord na końcu (awaria w trakcie zapisu) przesunąłby wszystkie kolejne
+        size = os.fstat(self._fd).st_size
+        if size % RECORD_SIZE:
+            logging.warning(f"Obcinam niepełny rekord na końcu pliku historii {path}.")
+            os.ftruncate(self._fd, size - size % RECORD_SIZE)
+        # Kolejność zapisów w procesie zgodna z czasem zapisu
+        self._lock = threading.Lock()
+        self._last_recorded_at = 0.0
+
+    def append(self, changes):
+        """Dopisuje zmiany {slot: sekundy epoki albo NO_KILL} zapisane właśnie w magazynie stanu."""
+        if not changes:
+            return
+        with self._lock:
+            # Czas zapisu nie może się cofać (korekta zegara) - od niego zależy wyszukiwanie binarne
+            recorded_at = self._last_recorded_at = max(now_epoch(), self._last_recorded_at)
+            data = bytearray()
+            for slot, killed_at in changes.items():
+                channel_idx, boss_idx = self.layout.split_slot(slot)
+                action = ACTION_CLEAR if math.isnan(killed_at) else ACTION_KILL
+                data += RECORD.pack(recorded_at, killed_at, channel_idx, boss_idx, action)
+            start = time.perf_counter()
+            try:
+                os.write(self._fd, data)
+            except OSError as e:
+                logging.error(f"Błąd zapisu historii zabić: {e}")
+                return
+        self.persist_observer("history", time.perf_counter() - start)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def records(self, start, end):
+        """Zwraca iterator po rekordach (czas zapisu, czas zabicia, kanał, boss, akcja) zapisanych w [start, end).
+
+        Plik jest mapowany w pamięć przy każdym zapytaniu (widać też zapisy innych workerów),
+        a mapowanie jest zwalniane razem z iteratorem.
+        """
+        size = os.fstat(self._fd).st_size
+        size -= size % RECORD_SIZE
+        if size == 0:
+            return iter(())
+        mapped = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        recorded_at = _RecordedAtColumn(mapped, size // RECORD_SIZE)
+        first = bisect.bisect_left(recorded_at, start)
+        last = bisect.bisect_left(recorded_at, end, lo=first)
+        return RECORD.iter_unpack(memoryview(mapped)[first * RECORD_SIZE:last * RECORD_SIZE])
+
+    def respawn_intervals(self, start, end, max_interval_s, channel_idx=None, boss_idx=None):
+        """Odstępy między kolejnymi zabiciami tego samego slotu: {indeks bossa: posortowana array('d') sekund}.
+
+        Liczone są odstępy zabić zapisanych w [start, end) dłuższe od zera i nie dłuższe niż
+        `max_interval_s` (dłuższe przerwy to czas, gdy nikt nie polował). Poprzednie zabicie może
+        pochodzić sprzed okna - czytamy od `start - max_interval_s`. Czyszczenie nie przerywa serii.
+        """
+        last_kill = self.layout.empty_times()
+        intervals = {}
+        bosses = len(self.layout.bosses)
+        for recorded_at, killed_at, ch, boss, action in self.records(start - max_interval_s, end):
+            if action != ACTION_KILL or ch >= len(self.layout.channels) or boss >= bosses:
+                continue
+            if (channel_idx is not None and ch != channel_idx) or (boss_idx is not None and boss != boss_idx):
+                continue
+            slot = ch * bosses + boss
+            interval = killed_at - last_kill[slot]
+            last_kill[slot] = killed_at
+            if recorded_at >= start and 0 < interval <= max_interval_s:
+                values = intervals.get(boss)
+                if values is None:
+                    values = intervals[boss] = array('d')
+                values.append(interval)
+        return {boss: array('d', sorted(values)) for boss, values in intervals.items()}
+
+    def kill_counts(self, start, end):
+        """Liczniki zabić zapisanych w [start, end): (na kanał, na bossa, na godzinę doby, na pełną godzinę epoki).
+
+        Godziny liczone są od czasu zabicia podanego przez klienta (jego czas lokalny).
+        """
+        per_channel = Counter()
+        per_boss = Counter()
+        hour_of_day = [0] * 24
+        hourly = Counter()
+        for _, killed_at, ch, boss, action in self.records(start, end):
+            if action != ACTION_KILL:
+                continue
+            per_channel[ch] += 1
+            per_boss[boss] += 1
+            hour = int(killed_at // 3600)
+            hour_of_day[hour % 24] += 1
+            hourly[hour] += 1
+        return per_channel, per_boss, hour_of_day, hourly
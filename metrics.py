@@ -0,0 +1,161 @@
+"""Lekkie metryki serwera w formacie tekstowym Prometheusa (bez zewnętrznych zależności).
+
+Zapis metryki to kilka operacji na słowniku pod blokadą, a tekst jest składany dopiero przy
+odczycie /metrics. Metryki są per proces - przy wielu workerach gunicorna każdy scrape trafia
+do jednego z nich (liczniki trzeba sumować po `instance`/pid albo uruchamiać jeden worker).
+"""
+import bisect
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Progi histogramów czasu (sekundy) - od odczytu z pamięci podręcznej po fsync i long-poll
+LATENCY_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Licznik rosnący, osobny dla każdej kombinacji wartości etykiet."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.label_names, values), value) for values, value in sorted(items)]
+
+
+class Gauge:
+    """Wartość bieżąca: odczytywana funkcją `read` przy każdym scrape albo zmieniana przez inc/dec."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read=None):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self):
+        return [(self.name, "", self.read() if self.read else self._value)]
+
+
+class Histogram:
+    """Histogram z łącznymi kubełkami (le), sumą i liczbą obserwacji, per kombinacja etykiet."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS_S):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # wartości etykiet -> [liczniki kubełków (ostatni to +Inf), suma]
+        self._values = {}
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(values, list(counts), total) for values, (counts, total) in self._values.items()]
+        samples = []
+        for values, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names + ("le",), values + (_format_value(bound),))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.label_names, values)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class ActiveClients:
+    """Szacuje liczbę podłączonych klientów: różnych adresów widzianych w ostatnich `window_s` sekundach.
+
+    Adresy są trzymane od najdawniej widzianego, więc wygasłe leżą na początku i sprzątanie
+    zdejmuje tylko je. Ponad `max_tracked` adresów wypadają najdawniej widziane - pamięć jest
+    ograniczona także przy zalewie żądań z różnych adresów.
+    """
+
+    def __init__(self, window_s, max_tracked=10000):
+        self.window_s = window_s
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._last_seen = OrderedDict()
+
+    def seen(self, client_id):
+        now = time.monotonic()
+        with self._lock:
+            self._last_seen[client_id] = now
+            self._last_seen.move_to_end(client_id)
+            if len(self._last_seen) > self.max_tracked:
+                self._last_seen.popitem(last=False)
+
+    def count(self):
+        with self._lock:
+            cutoff = time.monotonic() - self.window_s
+            while self._last_seen and next(iter(self._last_seen.values())) < cutoff:
+                self._last_seen.popitem(last=False)
+            return len(self._last_seen)
+
+
+class Registry:
+    """Zbiór metryk renderowany do formatu tekstowego Prometheusa (wersja 0.0.4)."""
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
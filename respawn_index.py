@@ -0,0 +1,122 @@
+"""Indeks nadchodzących respawnów bossów dla /next_respawns.
+
+Czas respawnu slotu to czas zabicia + czas respawnu bossa z BOSS_CONFIG. Indeks trzyma kopiec
+(czas respawnu, slot) dla każdego kanału i jeden wspólny dla wszystkich kanałów, więc N
+najbliższych respawnów odczytuje się w O(N log n) bez przeglądania całego stanu.
+
+Zmiany są nakładane leniwie: nieaktualne wpisy (slot ma już inny czas respawnu) zostają w kopcu
+i są pomijane przy odczycie, a kopce są przebudowywane, gdy takich wpisów jest za dużo. Wpisy
+odrodzone względem zegara serwera są usuwane z kopca na stałe przy odczycie.
+Indeks dogania magazyn stanu przez changes_since, więc widzi też zmiany zapisane przez inne
+workery (SqliteStateStore).
+"""
+import heapq
+import math
+import threading
+
+from state_store import now_epoch
+
+# Kopiec jest przebudowywany, gdy ma więcej wpisów niż tyle razy liczba slotów
+_MAX_HEAP_FACTOR = 4
+
+
+class RespawnIndex:
+    """Kolejka priorytetowa respawnów zsynchronizowana z magazynem stanu."""
+
+    def __init__(self, layout, respawn_minutes, store):
+        self.layout = layout
+        self.store = store
+        # Czas respawnu w sekundach dla indeksu bossa
+        self._respawn_s = [respawn_minutes[boss] * 60 for boss in layout.bosses]
+        self._lock = threading.Lock()
+        self._boot = None
+        self._version = None
+        # Aktualny czas respawnu każdego slotu (NaN = brak zabicia) - wpis w kopcu jest ważny tylko, gdy się z nim zgadza
+        self._respawn_at = layout.empty_times()
+        # Kopce kolejnych kanałów, a na końcu wspólny kopiec wszystkich kanałów
+        self._heaps = [[] for _ in range(len(layout.channels) + 1)]
+
+    def next_respawns(self, limit, now=None, channel_idx=None):
+        """Zwraca (wersja stanu, [(czas respawnu, slot), ...]) dla `limit` najbliższych respawnów po `now`.
+
+        `channel_idx` zawęża wynik do jednego kanału. Bossowie już odrodzeni (respawn <= now)
+        i bez zabicia są pomijani. Bez `now` liczy się zegar serwera i odczyt z kopca kosztuje
+        O(limit log n). Inne "teraz" (klient w innej strefie czasowej) jest obsługiwane przeglądem
+        aktualnych czasów respawnu, bo kopiec nie trzyma wpisów sprzed zegara serwera.
+        """
+        with self._lock:
+            self._sync()
+            if now is not None:
+                return self._version, self._scan(limit, now, channel_idx)
+            heap = self._heaps[-1 if channel_idx is None else channel_idx]
+            now = now_epoch()
+            result = []
+            returned = set()
+            while heap and len(result) < limit:
+                respawn_at, slot = entry = heapq.heappop(heap)
+                # Nieaktualny wpis, duplikat już zwróconego albo już odrodzony - wyrzucamy na stałe
+                if respawn_at != self._respawn_at[slot] or slot in returned or respawn_at <= now:
+                    continue
+                returned.add(slot)
+                result.append(entry)
+            # Zwrócone wpisy nadal są aktualne - wracają do kopca
+            for entry in result:
+                heapq.heappush(heap, entry)
+            return self._version, result
+
+    def _scan(self, limit, now, channel_idx):
+        """`limit` najbliższych respawnów po dowolnym `now` - przegląd slotów (kanału), bez zmiany kopców."""
+        slots = range(len(self.layout)) if channel_idx is None else self.layout.channel_slots(self.layout.channels[channel_idx])
+        respawn_at = self._respawn_at
+        # NaN (brak zabicia) nie jest większe od now, więc odpada w filtrze
+        return heapq.nsmallest(limit, ((respawn_at[slot], slot) for slot in slots if respawn_at[slot] > now))
+
+    def _sync(self):
+        """Dogania magazyn stanu: nakłada nowe zmiany albo przebudowuje indeks ze snapshotu."""
+        boot = self.store.boot
+        changes = None
+        if boot == self._boot:
+            if self.store.version() == self._version:
+                return
+            version, changes = self.store.changes_since(self._version)
+        if changes is None:
+            version, times = self.store.snapshot()
+            for slot, killed_at in enumerate(times):
+                self._respawn_at[slot] = self._respawn_time(slot, killed_at)
+            self._rebuild()
+        else:
+            for _, slot, killed_at in changes:
+                self._set(slot, killed_at)
+        self._boot = boot
+        self._version = version
+
+    def _respawn_time(self, slot, killed_at):
+        return killed_at + self._respawn_s[self.layout.split_slot(slot)[1]]
+
+    def _set(self, slot, killed_at):
+        respawn_at = self._respawn_time(slot, killed_at)
+        previous = self._respawn_at[slot]
+        if respawn_at == previous or (math.isnan(respawn_at) and math.isnan(previous)):
+            return
+        self._respawn_at[slot] = respawn_at
+        if math.isnan(respawn_at):
+            # Stary wpis w kopcu stał się nieaktualny - zostanie pominięty przy odczycie
+            return
+        entry = (respawn_at, slot)
+        channel_idx = self.layout.split_slot(slot)[0]
+        heapq.heappush(self._heaps[channel_idx], entry)
+        heapq.heappush(self._heaps[-1], entry)
+        if len(self._heaps[-1]) > _MAX_HEAP_FACTOR * len(self.layout):
+            self._rebuild()
+
+    def _rebuild(self):
+        """Buduje kopce od nowa z samych aktualnych czasów respawnu."""
+        heaps = [[] for _ in self._heaps]
+        for slot, respawn_at in enumerate(self._respawn_at):
+            if math.isnan(respawn_at):
+                continue
+            heaps[self.layout.split_slot(slot)[0]].append((respawn_at, slot))
+            heaps[-1].append((respawn_at, slot))
+        for heap in heaps:
+            heapq.heapify(heap)
+        self._heaps = heaps
@@ -0,0 +1,71 @@
+"""Pamięć podręczna zserializowanych (i skompresowanych) odpowiedzi JSON endpointów odczytu.
+
+Odpowiedź zależy tylko od wersji stanu (i parametrów zapytania), więc dla bieżącej wersji
+JSON jest kodowany raz, razem z wariantami gzip i deflate, a kolejne żądania tylko wybierają
+gotowe bajty według Accept-Encoding. Zmiana stanu (nowa wersja) unieważnia całą zawartość.
+"""
+import gzip
+import threading
+import zlib
+
+# Kodowania w kolejności preferencji serwera
+ENCODINGS = ("gzip", "deflate")
+
+
+class EncodedResponse:
+    """Treść odpowiedzi JSON w postaci nieskompresowanej oraz gzip i deflate, z wersją stanu, z której pochodzi."""
+    __slots__ = ("version", "identity", "gzip", "deflate")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.identity = body
+        # mtime=0 - te same dane dają te same bajty. Krótkie odpowiedzi (np. pusta lista zmian)
+        # po kompresji bywają dłuższe - wtedy wysyłamy je bez kompresji.
+        self.gzip = _smaller_or_none(gzip.compress(body, compresslevel=6, mtime=0), body)
+        self.deflate = _smaller_or_none(zlib.compress(body, 6), body)
+
+    def encoded(self, accept_encodings):
+        """Zwraca (kodowanie albo None, bajty) dla nagłówka Accept-Encoding sparsowanego przez werkzeug."""
+        encoding = accept_encodings.best_match(ENCODINGS)
+        body = getattr(self, encoding) if encoding else None
+        if body is None:
+            return None, self.identity
+        return encoding, body
+
+
+def _smaller_or_none(compressed, body):
+    return compressed if len(compressed) < len(body) else None
+
+
+class ResponseCache:
+    """Odpowiedzi dla jednej (najnowszej) wersji stanu, kluczowane nazwą endpointu i parametrami."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                return None
+            return self._entries.get(key)
+
+    def put(self, key, version, body):
+        """Koduje i zapamiętuje treść dla wersji. Zwraca EncodedResponse (także gdy wersja jest już nieaktualna)."""
+        entry = EncodedResponse(version, body)
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._version = version
+                self._entries = {}
+            if version == self._version and len(self._entries) < self.max_entries:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, version):
+        """Usuwa odpowiedzi starsze niż `version` (wywoływane po zmianie stanu)."""
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._version = version
+                self._entries = {}
@@ -1,8 +1,15 @@
 import os
-from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
-import json
+import secrets
+import time
+from flask import Blueprint, Flask, request, jsonify, g
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
+from history_log import HistoryLog, percentile
+from metrics import ActiveClients, Counter, Gauge, Histogram, Registry
+from state_store import (NO_KILL, JournalStateStore, StateConflict, SqliteStateStore, StateLayout, epoch_to_iso, iso_to_epoch,
+                         load_json_state, now_epoch, times_to_dict)
+from tenants import (TENANT_CONFIG_FILE, Tenant, TenantNotFound, TenantRegistry, load_tenant_config, parse_tenant_config,
+                     save_tenant_config, valid_tenant_name)
 
 app = Flask(__name__)
 
@@ -10,6 +17,49 @@ app = Flask(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 BOSS_STATE_FILE = "boss_state.json"
+# Dziennik zmian dopisywanych po snapshocie BOSS_STATE_FILE (jedna linia JSON [klucz, timestamp] na zmianę)
+BOSS_JOURNAL_FILE = "boss_state.journal"
+# Po ilu wpisach w dzienniku zapisać nowy snapshot i wyczyścić dziennik
+JOURNAL_COMPACT_EVERY = 500
+# fsync dziennika najwyżej raz na tyle sekund (zapisy pomiędzy są grupowane)
+JOURNAL_FSYNC_INTERVAL_S = 1.0
+# Baza współdzielona przez workery przy STATE_BACKEND=sqlite (nadpisywana przez STATE_DB_FILE)
+BOSS_STATE_DB_FILE = "boss_state.db"
+# Binarna historia wszystkich zmian (rekordy stałej długości) dla endpointów /history/...
+BOSS_HISTORY_FILE = "boss_history.bin"
+
+# Ile ostatnich zmian trzymać w dzienniku dla /changes (starsze wymagają pełnego snapshotu)
+CHANGELOG_SIZE = 1000
+
+# Maksymalna liczba operacji w jednym żądaniu /batch_update
+MAX_BATCH_OPERATIONS = 200
+
+# Jak długo (w sekundach) /wait_for_change trzyma połączenie, jeśli nic się nie zmienia
+LONG_POLL_TIMEOUT_S = 25
+LONG_POLL_MAX_TIMEOUT_S = 60
+
+# Klient liczy się jako podłączony, jeśli wysłał żądanie w ciągu tylu sekund (dla /metrics)
+METRICS_CLIENT_WINDOW_S = 60
+# Liczba zaufanych proxy przed serwerem (np. 1 na hostingu z load balancerem). Tylko wtedy adres klienta
+# jest brany z X-Forwarded-For - bez proxy ten nagłówek ustawia sam klient i można go dowolnie podrobić.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
+# Domyślna liczba pozycji zwracanych przez /next_respawns
+NEXT_RESPAWNS_DEFAULT_LIMIT = 10
+
+# Domyślne okno czasowe zapytań /history/... (dni wstecz od teraz)
+HISTORY_DEFAULT_WINDOW_DAYS = 7
+# Odstępy między zabiciami dłuższe niż tyle minut to przerwy w polowaniu, a nie czas respawnu
+HISTORY_MAX_INTERVAL_MINUTES = 120
+
+# Katalog przestrzeni (/t/<nazwa>/...) - każda w podkatalogu z config.json i własnymi plikami stanu
+TENANTS_DIR = os.environ.get('TENANTS_DIR', "tenants")
+# Ile przestrzeni trzymać jednocześnie w pamięci (najdawniej używane są zamykane)
+MAX_LOADED_TENANTS = int(os.environ.get('MAX_LOADED_TENANTS', 100))
+# Token wymagany (nagłówek X-Admin-Token) do tworzenia przestrzeni - bez niego tworzenie jest wyłączone
+TENANT_ADMIN_TOKEN = os.environ.get('TENANT_ADMIN_TOKEN')
+# Przestrzeń tras bez prefiksu /t/<nazwa> - konfiguracja i pliki stanu poniżej (pusta nazwa nie koliduje z żadną inną)
+DEFAULT_TENANT = ""
 
 # Konfiguracja bossów (nazwa, czas respawnu w minutach)
 # Ta konfiguracja jest używana przez klienta do wyświetlania i przez serwer do określania czasów respawnu
@@ -25,65 +75,408 @@ BOSS_CONFIG = {
 # Lista kanałów - KLUCZOWA DLA SERWERA, aby wiedział, jakie klucze są poprawne
 CHANNELS = ["CH1", "CH2", "CH3", "CH4", "CH5", "CH6"]
 
-def load_boss_state():
-    """Ładuje stan bossów z pliku JSON."""
-    if os.path.exists(BOSS_STATE_FILE):
-        try:
-            with open(BOSS_STATE_FILE, 'r') as f:
-                state = json.load(f)
-                validated_state = {}
-                for key, value in state.items():
-                    # Walidacja, czy klucz jest zgodny z oczekiwanym formatem (CH_BOSSNAME)
-                    # i czy boss_name jest w BOSS_CONFIG
-                    parts = key.split('_', 1) # Podziel tylko raz
-                    if len(parts) == 2 and parts[0] in CHANNELS and parts[1] in BOSS_CONFIG:
-                        if isinstance(value, str):
-                            try:
-                                datetime.fromisoformat(value)
-                                validated_state[key] = value
-                            except ValueError:
-                                logging.warning(f"Nieprawidłowy timestamp dla klucza {key}: {value}. Ignorowanie.")
-                        elif value is None:
-                            validated_state[key] = None
-                        else:
-                            logging.warning(f"Nieprawidłowa wartość dla klucza {key}: {value}. Ignorowanie.")
-                    else:
-                        logging.warning(f"Nieznany lub nieprawidłowy klucz w pliku boss_state.json: {key}. Ignorowanie.")
-                return validated_state
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logging.error(f"Błąd ładowania stanu bossów: {e}")
-            return {}
-    return {}
-
-def save_boss_state(state):
-    """Zapisuje stan bossów do pliku JSON."""
+# Indeksy kanałów i bossów - stan jest tablicą czasów zabicia indeksowaną slotem (kanał, boss),
+# a klucze "CH_BOSSNAME" i timestampy ISO występują tylko na wejściu i wyjściu API
+LAYOUT = StateLayout(CHANNELS, BOSS_CONFIG)
+
+def create_state_store(layout, directory="", db_file=None):
+    """Tworzy magazyn stanu wybrany zmienną środowiskową STATE_BACKEND, z plikami w katalogu `directory`.
+
+    "journal" (domyślnie) trzyma stan w pamięci procesu - tylko dla jednego workera.
+    "sqlite" używa współdzielonej bazy (`db_file`, domyślnie BOSS_STATE_DB_FILE w katalogu)
+    i pozwala uruchomić wiele workerów gunicorna.
+    """
+    backend = os.environ.get('STATE_BACKEND', 'journal')
+    state_file = os.path.join(directory, BOSS_STATE_FILE)
+    journal_file = os.path.join(directory, BOSS_JOURNAL_FILE)
+    if backend == 'sqlite':
+        db_file = db_file or os.path.join(directory, BOSS_STATE_DB_FILE)
+        seed_state = None
+        if not os.path.exists(db_file):
+            seed_state = load_json_state(state_file, journal_file, layout)
+        return SqliteStateStore(layout, db_file, changelog_size=CHANGELOG_SIZE, seed_times=seed_state,
+                                persist_observer=observe_persist)
+    if backend != 'journal':
+        raise ValueError(f"Nieznany STATE_BACKEND: {backend}")
+    return JournalStateStore(layout, state_file, journal_file, changelog_size=CHANGELOG_SIZE,
+                             compact_every=JOURNAL_COMPACT_EVERY, fsync_interval_s=JOURNAL_FSYNC_INTERVAL_S,
+                             persist_observer=observe_persist)
+
+def tenant_dir(name):
+    return os.path.join(TENANTS_DIR, name)
+
+def load_tenant(name):
+    """Ładuje przestrzeń z dysku (dla TenantRegistry). Rzuca TenantNotFound dla nieistniejącej."""
+    if name == DEFAULT_TENANT:
+        return Tenant(name, LAYOUT, BOSS_CONFIG, create_state_store(LAYOUT, db_file=os.environ.get('STATE_DB_FILE')),
+                      HistoryLog(LAYOUT, BOSS_HISTORY_FILE, persist_observer=observe_persist))
+    directory = tenant_dir(name)
+    channels, bosses = load_tenant_config(os.path.join(directory, TENANT_CONFIG_FILE))
+    layout = StateLayout(channels, bosses)
+    tenant = Tenant(name, layout, bosses, create_state_store(layout, directory),
+                    HistoryLog(layout, os.path.join(directory, BOSS_HISTORY_FILE), persist_observer=observe_persist))
+    logging.info(f"Załadowano przestrzeń {name} ({len(channels)} kanałów, {len(bosses)} bossów).")
+    return tenant
+
+# Metryki dla /metrics (per proces/worker)
+metrics_registry = Registry()
+http_requests_total = metrics_registry.register(Counter(
+    "boss_tracker_http_requests_total", "Liczba obsłużonych żądań HTTP.", ("endpoint", "method", "status")))
+http_request_duration = metrics_registry.register(Histogram(
+    "boss_tracker_http_request_duration_seconds", "Czas obsługi żądania HTTP.", ("endpoint",)))
+persist_duration = metrics_registry.register(Histogram(
+    "boss_tracker_persist_duration_seconds", "Czas zapisu stanu na dysk (dziennik, snapshot, transakcja SQLite albo historia).", ("operation",)))
+long_poll_waiting = metrics_registry.register(Gauge(
+    "boss_tracker_long_poll_waiting", "Liczba żądań /wait_for_change czekających na zmianę."))
+active_clients = ActiveClients(METRICS_CLIENT_WINDOW_S)
+
+def observe_persist(operation, seconds):
+    persist_duration.observe(seconds, operation)
+
+# Przestrzenie ładowane leniwie; domyślna jest ładowana przy starcie serwera i nigdy nie jest zamykana
+tenants = TenantRegistry(load_tenant, MAX_LOADED_TENANTS, pinned=(DEFAULT_TENANT,))
+default_tenant = tenants.acquire(DEFAULT_TENANT)
+metrics_registry.register(Gauge("boss_tracker_state_version", "Bieżąca wersja stanu przestrzeni domyślnej.",
+                                default_tenant.store.version))
+metrics_registry.register(Gauge("boss_tracker_tenants_loaded", "Liczba przestrzeni załadowanych do pamięci.",
+                                tenants.loaded_count))
+metrics_registry.register(Gauge(
+    "boss_tracker_active_clients", f"Szacowana liczba klientów (różne adresy w ostatnich {METRICS_CLIENT_WINDOW_S} s).",
+    active_clients.count))
+
+# Endpointy stanu - rejestrowane bez prefiksu (przestrzeń domyślna) i pod /t/<tenant>
+api = Blueprint('api', __name__)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Za zaufanym proxy remote_addr pochodzi z X-Forwarded-For (ProxyFix) - patrz TRUSTED_PROXY_HOPS
+    active_clients.seen(request.remote_addr)
+
+@app.after_request
+def record_request_metrics(response):
+    # Szablon trasy zamiast ścieżki - ograniczona liczba serii (np. /reset_channel/<channel_name>)
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    start = g.get('request_start')
+    if start is not None:
+        http_request_duration.observe(time.perf_counter() - start, endpoint)
+    http_requests_total.inc(endpoint, request.method, response.status_code)
+    return response
+
+@api.url_value_preprocessor
+def pull_tenant_name(endpoint, values):
+    g.tenant_name = values.pop('tenant', DEFAULT_TENANT) if values else DEFAULT_TENANT
+
+@api.before_request
+def acquire_tenant():
+    """Ładuje przestrzeń żądania do g.tenant (nieznana albo niepoprawna nazwa to 404)."""
+    name = g.tenant_name
+    if name != DEFAULT_TENANT and not valid_tenant_name(name):
+        return jsonify({"message": f"Błąd: Nieznana przestrzeń {name}"}), 404
     try:
-        with open(BOSS_STATE_FILE, 'w') as f:
-            json.dump(state, f, indent=4)
-    except IOError as e:
-        logging.error(f"Błąd zapisu stanu bossów: {e}")
-
-# Inicjalizacja stanu bossów przy starcie serwera
-boss_state = load_boss_state()
-
-# NOWA LOGIKA: Jeśli boss_state jest pusty po załadowaniu, zainicjuj go domyślnymi wartościami
-if not boss_state:
-    logging.info("Stan bossów jest pusty lub plik nie istnieje. Inicjalizuję domyślny stan.")
-    for channel in CHANNELS:
-        for boss_name_from_config in BOSS_CONFIG.keys():
-            key = f"{channel}_{boss_name_from_config}"
-            boss_state[key] = None # Ustaw początkowy stan na None (niezbity/aktywny)
-    save_boss_state(boss_state) # Zapisz zainicjowany stan do pliku
-
-@app.route('/get_state', methods=['GET'])
+        g.tenant = tenants.acquire(name)
+    except TenantNotFound:
+        return jsonify({"message": f"Błąd: Nieznana przestrzeń {name}"}), 404
+
+@api.teardown_request
+def release_tenant(exc):
+    tenant = g.pop('tenant', None)
+    if tenant is not None:
+        tenants.release(tenant.name)
+
+def state_etag(tenant, version):
+    """Zwraca ETag dla wersji stanu. Identyfikator magazynu w ETagu chroni przed fałszywym 304 po restarcie.
+
+    ETag jest wysyłany jako słaby (W/"..."): ta sama wersja ma różne bajty w kodowaniu gzip,
+    deflate i bez kompresji, a silny ETag obiecywałby identyczną treść.
+    """
+    return f"{tenant.store.boot}-{version}"
+
+def changes_payload(tenant, since, boot):
+    """Buduje odpowiedź z listą zmian nowszych niż `since` albo pełny snapshot."""
+    store = tenant.store
+    if boot == store.boot:
+        version, changes = store.changes_since(since)
+        if changes is not None:
+            keys = tenant.layout.keys
+            changes = [{"version": v, "key": keys[slot], "timestamp": epoch_to_iso(seconds)} for v, slot, seconds in changes]
+            return {"boot": store.boot, "since": since, "version": version, "full": False, "changes": changes}
+    # Wersja klienta wypadła z dziennika (albo serwer został zrestartowany) - wyślij wszystko
+    version, times = store.snapshot()
+    return {"boot": store.boot, "version": version, "full": True, "state": times_to_dict(times, tenant.layout)}
+
+def cached_json_response(tenant, key, version, build):
+    """Zwraca odpowiedź JSON z pamięci podręcznej dla wersji `version`, w kodowaniu wynegocjowanym z klientem.
+
+    Przy braku wpisu `build()` zwraca (wersja, payload) - treść jest kodowana i kompresowana raz
+    i zapamiętywana pod wersją, z której faktycznie pochodzi.
+    """
+    entry = tenant.response_cache.get(key, version)
+    if entry is None:
+        built_version, payload = build()
+        entry = tenant.response_cache.put(key, built_version, app.json.dumps(payload).encode('utf-8') + b"\n")
+    encoding, body = entry.encoded(request.accept_encodings)
+    response = app.response_class(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # ETag z wersji treści - build() mógł już widzieć nowszą wersję niż `version`
+    response.set_etag(state_etag(tenant, entry.version), weak=True)
+    return response
+
+def cached_changes_response(tenant, since, boot, version):
+    """Odpowiedź /changes i /wait_for_change - zależy tylko od wersji, `since` i tego, czy boot klienta jest aktualny."""
+    def build():
+        payload = changes_payload(tenant, since, boot)
+        return payload["version"], payload
+    return cached_json_response(tenant, ("changes", since, boot == tenant.store.boot), version, build)
+
+def not_modified(tenant, version):
+    """Odpowiedź 304, jeśli klient ma już wersję `version` (If-None-Match), w przeciwnym razie None."""
+    etag = state_etag(tenant, version)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def mutation_payload(tenant, version, changes):
+    """Buduje odpowiedź endpointu zmieniającego stan: nową wersję i autorytatywne wartości zmienionych kluczy.
+
+    Ma ten sam format co odpowiedź /changes (z since = wersja sprzed zmiany), więc klient
+    nakłada ją bez dodatkowego GET. Zmiana bez efektu nie tworzy wersji - wtedy since = version.
+    """
+    keys = tenant.layout.keys
+    since = version - 1 if changes else version
+    changes = [{"version": version, "key": keys[slot], "timestamp": epoch_to_iso(seconds)} for slot, seconds in changes.items()]
+    return {"boot": tenant.store.boot, "since": since, "version": version, "full": False, "changes": changes}
+
+def mutation_response(tenant, version, changes, **fields):
+    """Dopisuje zmianę stanu do historii, unieważnia odpowiedzi odczytu i buduje odpowiedź endpointu zmieniającego stan."""
+    tenant.history.append(changes)
+    tenant.response_cache.invalidate(version)
+    response = jsonify({**fields, **mutation_payload(tenant, version, changes)})
+    response.set_etag(state_etag(tenant, version), weak=True)
+    return response
+
+def conflict_response(tenant, conflict):
+    """Odpowiedź 409 na niespełniony warunek compare-and-set: bieżące wartości spornych kluczy.
+
+    Klient rozstrzyga konflikt na ich podstawie, bez dodatkowego GET.
+    """
+    keys = tenant.layout.keys
+    conflicts = [{"key": keys[slot], "timestamp": epoch_to_iso(seconds)} for slot, seconds in conflict.current.items()]
+    logging.info(f"Konflikt zmiany dla kluczy: {', '.join(entry['key'] for entry in conflicts)}")
+    return jsonify({"message": "Konflikt: stan bossa zmienił się w międzyczasie", "boot": tenant.store.boot,
+                    "version": conflict.version, "conflicts": conflicts}), 409
+
+@api.route('/get_state', methods=['GET'])
 def get_state():
     """Zwraca aktualny stan wszystkich bossów."""
-    logging.info("Odebrano żądanie GET /get_state")
-    return jsonify(boss_state)
+    # Odpytywane co kilka sekund przez każdego klienta - na poziomie INFO zalewałoby log (ruch widać w /metrics)
+    logging.debug("Odebrano żądanie GET /get_state")
+    tenant = g.tenant
+    version = tenant.store.version()
+    # Klient ma już tę wersję - nie wysyłaj ponownie całego stanu
+    response = not_modified(tenant, version)
+    if response is not None:
+        return response
+    def build():
+        version, times = tenant.store.snapshot()
+        return version, times_to_dict(times, tenant.layout)
+    return cached_json_response(tenant, "state", version, build)
+
+@api.route('/changes', methods=['GET'])
+def get_changes():
+    """Zwraca tylko zmiany nowsze niż wersja `since` (lub pełny snapshot, gdy dziennik jej nie obejmuje)."""
+    since = request.args.get('since', default=0, type=int)
+    boot = request.args.get('boot')
+
+    tenant = g.tenant
+    version = tenant.store.version()
+    response = not_modified(tenant, version)
+    if response is not None:
+        return response
+    return cached_changes_response(tenant, since, boot, version)
+
+@api.route('/wait_for_change', methods=['GET'])
+def wait_for_change():
+    """Long-poll: czeka, aż wersja stanu przekroczy `since`, i zwraca zmiany jak /changes.
+
+    Jeśli w ciągu `timeout` sekund nic się nie zmieni, zwraca pustą listę zmian.
+    Każde oczekujące żądanie zajmuje wątek, więc pod gunicornem należy używać
+    workerów wątkowych (np. `-k gthread --threads 100`).
+    """
+    since = request.args.get('since', default=0, type=int)
+    boot = request.args.get('boot')
+    timeout = request.args.get('timeout', default=LONG_POLL_TIMEOUT_S, type=float)
+    timeout = max(0.0, min(timeout, LONG_POLL_MAX_TIMEOUT_S))
+
+    # Nieaktualny klient (inny boot) dostaje snapshot od razu, bez czekania
+    tenant = g.tenant
+    if boot == tenant.store.boot:
+        long_poll_waiting.inc()
+        try:
+            tenant.store.wait_for_change(since, timeout)
+        finally:
+            long_poll_waiting.dec()
+    return cached_changes_response(tenant, since, boot, tenant.store.version())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metryki serwera w formacie tekstowym Prometheusa."""
+    return app.response_class(metrics_registry.render(), content_type=Registry.CONTENT_TYPE)
+
+@api.route('/config', methods=['GET'])
+def get_config():
+    """Zwraca konfigurację przestrzeni: kanały i czasy respawnu bossów (w minutach)."""
+    tenant = g.tenant
+    return jsonify({"channels": tenant.layout.channels, "bosses": tenant.boss_config})
+
+@app.route('/t/<tenant>/config', methods=['PUT'])
+def create_tenant(tenant):
+    """Tworzy nową przestrzeń z konfiguracją {"channels": [...], "bosses": {nazwa: minuty}}.
 
-@app.route('/update_boss_status', methods=['POST'])
+    Wymaga nagłówka X-Admin-Token równego TENANT_ADMIN_TOKEN. Konfiguracji istniejącej przestrzeni
+    nie można zmienić (409) - układ slotów jej stanu zależy od kanałów i bossów.
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if not TENANT_ADMIN_TOKEN or not secrets.compare_digest(token.encode('utf-8'), TENANT_ADMIN_TOKEN.encode('utf-8')):
+        logging.warning(f"Odrzucono próbę utworzenia przestrzeni {tenant} bez poprawnego tokenu.")
+        return jsonify({"message": "Błąd: Brak uprawnień do tworzenia przestrzeni"}), 403
+    if not valid_tenant_name(tenant):
+        return jsonify({"message": "Błąd: Nazwa przestrzeni może zawierać tylko litery, cyfry, _ i - (do 64 znaków)"}), 400
+    try:
+        channels, bosses = parse_tenant_config(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"message": f"Błąd: {e}"}), 400
+    if not save_tenant_config(os.path.join(tenant_dir(tenant), TENANT_CONFIG_FILE), channels, bosses):
+        return jsonify({"message": f"Błąd: Przestrzeń {tenant} już istnieje"}), 409
+    logging.info(f"Utworzono przestrzeń {tenant} ({len(channels)} kanałów, {len(bosses)} bossów).")
+    return jsonify({"message": f"Przestrzeń {tenant} utworzona pomyślnie", "channels": channels, "bosses": bosses}), 201
+
+@api.route('/next_respawns', methods=['GET'])
+def next_respawns():
+    """Zwraca `limit` najbliższych respawnów (opcjonalnie tylko dla kanału `channel`), od najwcześniejszego.
+
+    Timestampy klientów są czasem lokalnym bez strefy, więc "teraz" to domyślnie zegar ścienny
+    serwera - klient w innej strefie może podać własny parametrem `now` (ISO 8601).
+    """
+    tenant = g.tenant
+    layout = tenant.layout
+    limit = request.args.get('limit', default=NEXT_RESPAWNS_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, len(layout)))
+    channel_name = request.args.get('channel')
+    channel_idx = None
+    if channel_name is not None:
+        channel_idx = layout.channel_index.get(channel_name)
+        if channel_idx is None:
+            return jsonify({"message": f"Błąd: Nieznany kanał {channel_name}"}), 400
+    try:
+        client_now = iso_to_epoch(request.args['now']) if request.args.get('now') else None
+    except ValueError:
+        return jsonify({"message": "Błąd: Nieprawidłowy format parametru now"}), 400
+
+    # Bez `now` indeks odczytuje kopiec według zegara serwera, z `now` - przegląda sloty
+    version, entries = tenant.respawn_index.next_respawns(limit, client_now, channel_idx)
+    now = client_now if client_now is not None else now_epoch()
+    respawns = []
+    for respawn_at, slot in entries:
+        ch_idx, boss_idx = layout.split_slot(slot)
+        respawns.append({"channel": layout.channels[ch_idx], "boss": layout.bosses[boss_idx], "key": layout.keys[slot],
+                         "respawn_at": epoch_to_iso(respawn_at)})
+    return jsonify({"boot": tenant.store.boot, "version": version, "now": epoch_to_iso(now), "respawns": respawns})
+
+def history_window():
+    """Zwraca okno (początek, koniec) zapytania /history/... z parametrów `from` i `to` (ISO 8601).
+
+    Domyślnie ostatnie HISTORY_DEFAULT_WINDOW_DAYS dni. Okno dotyczy czasu zapisu zmiany na
+    serwerze. Rzuca ValueError dla niepoprawnych parametrów.
+    """
+    end = iso_to_epoch(request.args['to']) if request.args.get('to') else now_epoch()
+    start = iso_to_epoch(request.args['from']) if request.args.get('from') else end - HISTORY_DEFAULT_WINDOW_DAYS * 86400
+    if not start < end:
+        raise ValueError("from musi być wcześniejsze niż to")
+    return start, end
+
+@api.route('/history/respawn_intervals', methods=['GET'])
+def history_respawn_intervals():
+    """Rozkład odstępów między kolejnymi zabiciami tego samego bossa na tym samym kanale, per boss.
+
+    Pozwala sprawdzić czasy respawnu z konfiguracji: statystyki w minutach i histogram
+    z kubełkami 1-minutowymi. Parametry: `from`, `to`, opcjonalnie `channel`, `boss` i
+    `max_minutes` (dłuższe odstępy są pomijane jako przerwy w polowaniu).
+    """
+    tenant = g.tenant
+    layout = tenant.layout
+    try:
+        start, end = history_window()
+    except ValueError:
+        return jsonify({"message": "Błąd: Nieprawidłowe okno czasowe (from/to)"}), 400
+    max_minutes = request.args.get('max_minutes', default=HISTORY_MAX_INTERVAL_MINUTES, type=int)
+    max_minutes = max(1, min(max_minutes, 24 * 60))
+    channel_name = request.args.get('channel')
+    channel_idx = None
+    if channel_name is not None:
+        channel_idx = layout.channel_index.get(channel_name)
+        if channel_idx is None:
+            return jsonify({"message": f"Błąd: Nieznany kanał {channel_name}"}), 400
+    boss_name = request.args.get('boss')
+    boss_idx = None
+    if boss_name is not None:
+        boss_idx = layout.boss_index.get(boss_name)
+        if boss_idx is None:
+            return jsonify({"message": f"Błąd: Nieznany boss {boss_name}"}), 400
+
+    intervals = tenant.history.respawn_intervals(start, end, max_minutes * 60, channel_idx, boss_idx)
+    bosses = {}
+    for boss_idx, values in sorted(intervals.items()):
+        minutes = [value / 60 for value in values]
+        histogram = {}
+        for value in minutes:
+            histogram[int(value)] = histogram.get(int(value), 0) + 1
+        bosses[layout.bosses[boss_idx]] = {
+            "configured_minutes": tenant.boss_config[layout.bosses[boss_idx]],
+            "count": len(minutes),
+            "min": round(minutes[0], 2),
+            "p10": round(percentile(minutes, 0.1), 2),
+            "median": round(percentile(minutes, 0.5), 2),
+            "p90": round(percentile(minutes, 0.9), 2),
+            "max": round(minutes[-1], 2),
+            "mean": round(sum(minutes) / len(minutes), 2),
+            "histogram": [{"minute": minute, "count": count} for minute, count in sorted(histogram.items())],
+        }
+    return jsonify({"from": epoch_to_iso(start), "to": epoch_to_iso(end), "max_minutes": max_minutes, "bosses": bosses})
+
+@api.route('/history/kills', methods=['GET'])
+def history_kills():
+    """Liczba zabić w oknie `from`-`to`: łącznie, per kanał, per boss, per godzina doby i w kolejnych godzinach."""
+    tenant = g.tenant
+    layout = tenant.layout
+    try:
+        start, end = history_window()
+    except ValueError:
+        return jsonify({"message": "Błąd: Nieprawidłowe okno czasowe (from/to)"}), 400
+
+    per_channel, per_boss, hour_of_day, hourly = tenant.history.kill_counts(start, end)
+    return jsonify({
+        "from": epoch_to_iso(start),
+        "to": epoch_to_iso(end),
+        "total": sum(hour_of_day),
+        "per_channel": {channel: per_channel[idx] for idx, channel in enumerate(layout.channels)},
+        "per_boss": {boss: per_boss[idx] for idx, boss in enumerate(layout.bosses)},
+        "hour_of_day": hour_of_day,
+        "hourly": [{"hour": epoch_to_iso(hour * 3600), "kills": count} for hour, count in sorted(hourly.items())],
+    })
+
+@api.route('/update_boss_status', methods=['POST'])
 def update_boss_status():
-    """Aktualizuje status bossa (zbity/aktywny)."""
+    """Aktualizuje status bossa (zbity/aktywny).
+
+    Opcjonalne pole "expected" (ISO 8601 albo null) to compare-and-set: zmiana jest zapisywana tylko,
+    jeśli bieżąca wartość klucza jest równa oczekiwanej, a w przeciwnym razie odpowiedź 409 zawiera
+    bieżącą wartość.
+    """
     data = request.get_json()
     key = data.get('key')
     timestamp = data.get('timestamp') # Może być None dla "aktywny"
@@ -93,52 +486,138 @@ def update_boss_status():
         return jsonify({"message": "Błąd: Brak klucza bossa"}), 400
 
     # Sprawdź, czy klucz jest poprawny (np. "CH1_Szeptotruj #1")
-    parts = key.split('_', 1)
-    is_valid_key_format = (len(parts) == 2 and parts[0] in CHANNELS and parts[1] in BOSS_CONFIG)
-
-    if is_valid_key_format:
-        if timestamp is None:
-            boss_state[key] = None
-            logging.info(f"Boss {key} ustawiony na aktywny (brak timestampu).")
-        else:
-            try:
-                datetime.fromisoformat(timestamp)
-                boss_state[key] = timestamp
-                logging.info(f"Boss {key} zbity o: {timestamp}")
-            except ValueError:
-                logging.warning(f"Nieprawidłowy format timestampu dla klucza {key}: {timestamp}. Użyj ISO 8601.")
-                return jsonify({"message": "Błąd: Nieprawidłowy format timestampu"}), 400
-    else:
+    tenant = g.tenant
+    slot = tenant.boss_slot(key)
+    if slot is None:
         logging.warning(f"Odebrano żądanie POST /update_boss_status z nieznanym lub nieprawidłowym kluczem: {key}")
         return jsonify({"message": f"Błąd: Nieznany lub nieprawidłowy klucz bossa {key}"}), 404
 
-    save_boss_state(boss_state)
-    return jsonify({"message": "Status zaktualizowany pomyślnie", "current_state": boss_state})
+    try:
+        killed_at = iso_to_epoch(timestamp)
+    except ValueError:
+        logging.warning(f"Nieprawidłowy format timestampu dla klucza {key}: {timestamp}. Użyj ISO 8601.")
+        return jsonify({"message": "Błąd: Nieprawidłowy format timestampu"}), 400
+
+    expected = None
+    if 'expected' in data:
+        try:
+            expected = [iso_to_epoch(data['expected'])]
+        except ValueError:
+            logging.warning(f"Nieprawidłowy format wartości expected dla klucza {key}: {data['expected']}.")
+            return jsonify({"message": "Błąd: Nieprawidłowy format oczekiwanej wartości (expected)"}), 400
 
-@app.route('/reset_channel/<channel_name>', methods=['POST'])
+    try:
+        version, changes = tenant.store.apply([(slot, killed_at)], expected)
+    except StateConflict as conflict:
+        return conflict_response(tenant, conflict)
+    if timestamp is None:
+        logging.info(f"Boss {key} ustawiony na aktywny (brak timestampu).")
+    else:
+        logging.info(f"Boss {key} zbity o: {timestamp}")
+    return mutation_response(tenant, version, changes, message="Status zaktualizowany pomyślnie")
+
+@api.route('/reset_channel/<channel_name>', methods=['POST'])
 def reset_channel(channel_name):
-    """Resetuje wszystkie statusy bossów dla danego kanału."""
-    if channel_name not in CHANNELS:
+    """Resetuje wszystkie statusy bossów dla danego kanału.
+
+    Opcjonalne {"expected": {klucz: ISO 8601 albo null}} w treści żądania to compare-and-set dla
+    wybranych kluczy kanału - przy niezgodności nic nie jest resetowane (odpowiedź 409).
+    """
+    tenant = g.tenant
+    if channel_name not in tenant.layout.channel_index:
         logging.warning(f"Odebrano żądanie resetu dla nieznanego kanału: {channel_name}")
         return jsonify({"message": f"Błąd: Nieznany kanał {channel_name}"}), 400
 
-    reset_count = 0
-    # Iteruj przez kopię kluczy, aby uniknąć RuntimeError podczas modyfikacji słownika
-    for key in list(boss_state.keys()):
-        # Sprawdź, czy klucz należy do danego kanału i czy część bossa jest w BOSS_CONFIG
-        if key.startswith(f"{channel_name}_"):
-            boss_part = key[len(f"{channel_name}_"):]
-            if boss_part in BOSS_CONFIG: # Upewnij się, że resetujemy tylko znane bossy
-                boss_state[key] = None
-                reset_count += 1
-    
-    if reset_count > 0:
-        save_boss_state(boss_state)
-        logging.info(f"Zresetowano {reset_count} bossów dla kanału {channel_name}.")
-        return jsonify({"message": f"Kanał {channel_name} zresetowany pomyślnie", "reseted_bosses_count": reset_count})
-    else:
-        logging.info(f"Brak bossów do zresetowania dla kanału {channel_name} (być może już są aktywne).")
-        return jsonify({"message": f"Brak bossów do zresetowania dla kanału {channel_name}."}), 200 # Zwróć 200 OK, jeśli nic nie zresetowano, ale żądanie było poprawne
+    slots = tenant.layout.channel_slots(channel_name)
+    expected = None
+    expected_state = (request.get_json(silent=True) or {}).get('expected')
+    if expected_state is not None:
+        if not isinstance(expected_state, dict):
+            return jsonify({"message": "Błąd: Pole expected musi być słownikiem {klucz: timestamp}"}), 400
+        expected = [None] * len(slots)
+        for key, value in expected_state.items():
+            slot = tenant.boss_slot(key)
+            if slot not in slots:
+                return jsonify({"message": f"Błąd: Klucz {key} nie należy do kanału {channel_name}"}), 400
+            try:
+                expected[slot - slots.start] = iso_to_epoch(value)
+            except ValueError:
+                return jsonify({"message": "Błąd: Nieprawidłowy format oczekiwanej wartości (expected)"}), 400
+
+    try:
+        version, changes = tenant.store.apply([(slot, NO_KILL) for slot in slots], expected)
+    except StateConflict as conflict:
+        return conflict_response(tenant, conflict)
+    reset_count = len(changes)
+
+    logging.info(f"Zresetowano {reset_count} bossów dla kanału {channel_name}.")
+    return mutation_response(tenant, version, changes, message=f"Kanał {channel_name} zresetowany pomyślnie",
+                             reseted_bosses_count=reset_count)
+
+@api.route('/batch_update', methods=['POST'])
+def batch_update():
+    """Wykonuje atomowo listę operacji jako jedną wersję stanu i jeden zapis.
+
+    Oczekuje {"operations": [...]}, gdzie operacja to {"key": ..., "timestamp": ...}
+    (jak w /update_boss_status, także z "expected") albo {"reset_channel": "CH1"}. Jeśli którakolwiek
+    operacja jest niepoprawna albo jej warunek "expected" nie jest spełniony, nie jest wykonywana żadna.
+    Warunek kolejnej operacji na tym samym kluczu odnosi się do wartości ustawionej przez poprzednią.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+
+    if not isinstance(operations, list) or not operations:
+        logging.warning("Odebrano żądanie POST /batch_update bez listy operacji.")
+        return jsonify({"message": "Błąd: Brak listy operacji"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        logging.warning(f"Odebrano żądanie POST /batch_update z {len(operations)} operacjami (limit {MAX_BATCH_OPERATIONS}).")
+        return jsonify({"message": f"Błąd: Za dużo operacji (maksymalnie {MAX_BATCH_OPERATIONS})"}), 400
+
+    # Najpierw walidacja i zamiana wszystkich operacji na (slot, czas), dopiero potem zmiany - batch jest atomowy
+    tenant = g.tenant
+    layout = tenant.layout
+    updates = []
+    expected = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            return jsonify({"message": "Błąd: Nieprawidłowa operacja", "index": index}), 400
+        if 'reset_channel' in operation:
+            channel_name = operation['reset_channel']
+            if not isinstance(channel_name, str) or channel_name not in layout.channel_index:
+                logging.warning(f"Batch: reset nieznanego kanału: {channel_name}")
+                return jsonify({"message": f"Błąd: Nieznany kanał {channel_name}", "index": index}), 400
+            updates.extend((slot, NO_KILL) for slot in layout.channel_slots(channel_name))
+            expected.extend([None] * len(layout.bosses))
+            continue
+        slot = tenant.boss_slot(operation.get('key'))
+        if slot is None:
+            logging.warning(f"Batch: nieznany lub nieprawidłowy klucz bossa: {operation.get('key')}")
+            return jsonify({"message": f"Błąd: Nieznany lub nieprawidłowy klucz bossa {operation.get('key')}", "index": index}), 400
+        try:
+            updates.append((slot, iso_to_epoch(operation.get('timestamp'))))
+        except ValueError:
+            logging.warning(f"Batch: nieprawidłowy format timestampu dla klucza {operation['key']}: {operation.get('timestamp')}.")
+            return jsonify({"message": "Błąd: Nieprawidłowy format timestampu", "index": index}), 400
+        try:
+            expected.append(iso_to_epoch(operation['expected']) if 'expected' in operation else None)
+        except ValueError:
+            logging.warning(f"Batch: nieprawidłowy format wartości expected dla klucza {operation['key']}: {operation['expected']}.")
+            return jsonify({"message": "Błąd: Nieprawidłowy format oczekiwanej wartości (expected)", "index": index}), 400
+
+    try:
+        version, changes = tenant.store.apply(updates, expected if any(e is not None for e in expected) else None)
+    except StateConflict as conflict:
+        return conflict_response(tenant, conflict)
+
+    logging.info(f"Batch: wykonano {len(operations)} operacji, zmieniono {len(changes)} kluczy.")
+    return mutation_response(tenant, version, changes, message="Operacje wykonane pomyślnie", applied=len(operations))
+
+# Trasy bez prefiksu obsługują przestrzeń domyślną, /t/<tenant>/... - przestrzeń o tej nazwie
+app.register_blueprint(api)
+app.register_blueprint(api, name='tenant_api', url_prefix='/t/<tenant>')
+
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,560 @@
+"""Magazyny stanu bossów używane przez server.py.
+
+Każdy magazyn trzyma czasy zabicia bossów jako tablicę sekund epoki indeksowaną pozycją
+(kanał, boss) z StateLayout (NaN = brak zabicia), licznik wersji rosnący przy każdej zmianie
+oraz ograniczony dziennik ostatnich zmian dla /changes. Klucze "CH_BOSS" i timestampy ISO 8601
+pojawiają się tylko na styku z API i plikami (iso_to_epoch / epoch_to_iso).
+
+- JournalStateStore - stan w pamięci procesu, trwałość przez snapshot JSON + dziennik.
+  Działa tylko z jednym workerem (każdy proces miałby własną kopię stanu).
+- SqliteStateStore - stan w bazie SQLite w trybie WAL, współdzielonej przez wszystkie
+  workery gunicorna. Wersja i dziennik zmian są w tej samej transakcji co stan.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+# Wartość w tablicy czasów oznaczająca "brak zabicia" (boss aktywny / nieznany)
+NO_KILL = math.nan
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+class StateConflict(Exception):
+    """Warunek compare-and-set nie był spełniony - nic nie zostało zapisane.
+
+    `current` to {slot: bieżąca wartość} kluczy, których oczekiwana wartość się nie zgadzała,
+    a `version` to wersja stanu, w której je odczytano.
+    """
+
+    def __init__(self, version, current):
+        super().__init__(f"Stan zmienił się dla {len(current)} kluczy")
+        self.version = version
+        self.current = current
+
+
+def find_conflicts(updates, expected, current_value):
+    """Sprawdza warunki compare-and-set dla listy zmian wykonywanych po kolei.
+
+    `expected[i]` to oczekiwana wartość slotu przed i-tą zmianą (None = bez warunku) - kolejne zmiany
+    tego samego slotu w jednym batchu oczekują wartości ustawionej przez poprzednią. Zwraca
+    {slot: bieżąca wartość} dla niespełnionych warunków.
+    """
+    conflicts = {}
+    pending = {}
+    for (slot, seconds), expected_seconds in zip(updates, expected):
+        if expected_seconds is not None and slot not in conflicts:
+            value = pending[slot] if slot in pending else current_value(slot)
+            if not times_match(value, expected_seconds):
+                conflicts[slot] = current_value(slot)
+        pending[slot] = seconds
+    return conflicts
+
+
+class StateLayout:
+    """Mapowanie kanałów i bossów na indeksy całkowite.
+
+    Pozycja (slot) bossa w tablicy stanu to indeks_kanału * liczba_bossów + indeks_bossa.
+    `slots` zamienia klucz API "CH1_Szeptotruj #1" na slot jednym odczytem ze słownika,
+    bez dzielenia napisu i przeszukiwania list.
+    """
+    __slots__ = ("channels", "bosses", "channel_index", "boss_index", "keys", "slots")
+
+    def __init__(self, channels, bosses):
+        self.channels = list(channels)
+        self.bosses = list(bosses)
+        self.channel_index = {channel: i for i, channel in enumerate(self.channels)}
+        self.boss_index = {boss: i for i, boss in enumerate(self.bosses)}
+        self.keys = [f"{channel}_{boss}" for channel in self.channels for boss in self.bosses]
+        self.slots = {key: slot for slot, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def slot(self, channel_idx, boss_idx):
+        return channel_idx * len(self.bosses) + boss_idx
+
+    def split_slot(self, slot):
+        """Zwraca (indeks kanału, indeks bossa) dla slotu."""
+        return divmod(slot, len(self.bosses))
+
+    def channel_slots(self, channel):
+        """Zwraca zakres slotów wszystkich bossów kanału."""
+        start = self.channel_index[channel] * len(self.bosses)
+        return range(start, start + len(self.bosses))
+
+    def empty_times(self):
+        """Nowa tablica czasów zabicia bez żadnych zabić."""
+        return array('d', [NO_KILL]) * len(self.keys)
+
+
+def iso_to_epoch(timestamp):
+    """Zamienia timestamp API (ISO 8601 albo None) na sekundy epoki (NO_KILL dla None).
+
+    Czas bez strefy (tak wysyła klient) jest traktowany jak zegar ścienny i przeliczany bez
+    przesunięć, więc epoch_to_iso odtwarza dokładnie ten sam napis. Czas ze strefą jest
+    sprowadzany do UTC. Rzuca ValueError dla niepoprawnej wartości.
+    """
+    if timestamp is None:
+        return NO_KILL
+    if not isinstance(timestamp, str):
+        raise ValueError(f"Timestamp musi być napisem ISO 8601, a nie {type(timestamp).__name__}")
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) / _SECOND
+
+def epoch_to_iso(seconds):
+    """Odwrotność iso_to_epoch: sekundy epoki -> ISO 8601 (None dla NO_KILL)."""
+    if math.isnan(seconds):
+        return None
+    return (_EPOCH + timedelta(microseconds=round(seconds * 1_000_000))).isoformat()
+
+def times_match(a, b):
+    """Czy dwa czasy (sekundy epoki) oznaczają ten sam timestamp API - z dokładnością do mikrosekundy, NO_KILL == NO_KILL."""
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return round(a * 1_000_000) == round(b * 1_000_000)
+
+def changed_values(updates, current_value):
+    """Zwraca {slot: wartość końcowa} dla par (slot, sekundy epoki), pomijając sloty, których wartość się nie zmienia."""
+    final = {}
+    for slot, seconds in updates:
+        final[slot] = seconds
+    return {slot: seconds for slot, seconds in final.items() if not times_match(current_value(slot), seconds)}
+
+def now_epoch():
+    """Bieżący czas lokalny (zegar ścienny, jak timestampy klientów) w sekundach epoki."""
+    return (datetime.now() - _EPOCH) / _SECOND
+
+def times_to_dict(times, layout):
+    """Zamienia tablicę czasów na słownik API {klucz: ISO 8601 albo None}."""
+    return {key: epoch_to_iso(seconds) for key, seconds in zip(layout.keys, times)}
+
+def load_snapshot(state_file, layout):
+    """Ładuje snapshot stanu bossów z pliku JSON do tablicy czasów, pomijając nieznane klucze i złe wartości."""
+    times = layout.empty_times()
+    if os.path.exists(state_file):
+        try:
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+                for key, value in state.items():
+                    # Walidacja, czy klucz jest zgodny z oczekiwanym formatem (CH_BOSSNAME)
+                    # i czy boss_name jest w BOSS_CONFIG
+                    slot = layout.slots.get(key)
+                    if slot is None:
+                        logging.warning(f"Nieznany lub nieprawidłowy klucz w pliku {state_file}: {key}. Ignorowanie.")
+                        continue
+                    try:
+                        times[slot] = iso_to_epoch(value)
+                    except ValueError:
+                        logging.warning(f"Nieprawidłowa wartość dla klucza {key}: {value}. Ignorowanie.")
+        except (json.JSONDecodeError, FileNotFoundError) as e:
+            logging.error(f"Błąd ładowania stanu bossów: {e}")
+    return times
+
+def replay_journal(times, journal_file, layout):
+    """Nakłada na tablicę czasów wpisy z dziennika zmian. Zwraca liczbę odtworzonych wpisów.
+
+    Wpis to [klucz, sekundy epoki albo null] (starsze wpisy mogą mieć timestamp ISO).
+    Uszkodzone linie (np. ostatnia, przerwana przez awarię w trakcie zapisu) są pomijane.
+    """
+    if not os.path.exists(journal_file):
+        return 0
+    replayed = 0
+    try:
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    key, value = json.loads(line)
+                    seconds = _journal_value_to_epoch(value)
+                except (json.JSONDecodeError, TypeError, ValueError):
+                    logging.warning(f"Uszkodzony wpis {line_no} w dzienniku {journal_file}. Ignorowanie.")
+                    continue
+                slot = layout.slots.get(key) if isinstance(key, str) else None
+                if slot is None:
+                    logging.warning(f"Nieprawidłowy wpis {line_no} w dzienniku {journal_file}: {key}. Ignorowanie.")
+                    continue
+                times[slot] = seconds
+                replayed += 1
+    except IOError as e:
+        logging.error(f"Błąd odczytu dziennika zmian: {e}")
+    return replayed
+
+def _journal_value_to_epoch(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return iso_to_epoch(value)
+
+def load_json_state(state_file, journal_file, layout):
+    """Odtwarza tablicę czasów: ostatni snapshot + zmiany zapisane później w dzienniku."""
+    times = load_snapshot(state_file, layout)
+    replayed = replay_journal(times, journal_file, layout)
+    if replayed:
+        logging.info(f"Odtworzono {replayed} zmian z dziennika {journal_file}.")
+    return times
+
+def save_json_snapshot(times, layout, state_file):
+    """Zapisuje pełny snapshot stanu bossów atomowo (plik tymczasowy + fsync + rename + fsync katalogu).
+
+    Plik ma format API ({klucz: ISO 8601 albo null}). Awaria w trakcie zapisu zostawia
+    poprzedni, kompletny snapshot.
+    """
+    tmp_path = f"{state_file}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(times_to_dict(times, layout), f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, state_file)
+        # Bez fsync katalogu nowa nazwa pliku może po awarii zasilania zniknąć - a dziennik jest
+        # czyszczony zaraz po zapisie snapshotu
+        fsync_directory(state_file)
+        return True
+    except OSError as e:
+        logging.error(f"Błąd zapisu stanu bossów: {e}")
+        return False
+
+def fsync_directory(path):
+    """Utrwala wpisy katalogu zawierającego `path` (np. po os.replace). W Windows nie da się otworzyć katalogu - nic nie robi."""
+    if os.name == 'nt':
+        return
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def transaction(conn, begin="BEGIN IMMEDIATE"):
+    """Transakcja SQLite na połączeniu w trybie autocommit: COMMIT przy sukcesie, ROLLBACK przy wyjątku."""
+    conn.execute(begin)
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _to_sql(seconds):
+    return None if math.isnan(seconds) else seconds
+
+def _from_sql(killed_at):
+    return NO_KILL if killed_at is None else killed_at
+
+def _ignore_persist_timing(operation, seconds):
+    pass
+
+
+class JournalStateStore:
+    """Stan w pamięci procesu z trwałością przez dziennik dopisywany po snapshocie JSON.
+
+    Zapis zmiany kosztuje O(1) (jedna linia JSON [klucz, sekundy epoki] na klucz). fsync jest
+    grupowany (najwyżej raz na `fsync_interval_s`) - zapisy pomiędzy utrwala timer najpóźniej po
+    `fsync_interval_s`, także gdy nie przychodzą kolejne. Co `compact_every` wpisów (i przy starcie)
+    stan jest kompaktowany do snapshotu zapisywanego atomowo.
+    `persist_observer(operacja, sekundy)` dostaje czas każdego zapisu ("journal" albo "snapshot").
+    """
+
+    def __init__(self, layout, state_file, journal_file, changelog_size=1000, compact_every=500, fsync_interval_s=1.0,
+                 persist_observer=None):
+        self.layout = layout
+        self.persist_observer = persist_observer or _ignore_persist_timing
+        self.state_file = state_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.fsync_interval_s = fsync_interval_s
+        # Identyfikator uruchomienia - wersje z innego uruchomienia są nieporównywalne. Losowy, bo wersja
+        # zaczyna się od 1 przy każdym wczytaniu (restart, nowy worker, ponowne załadowanie przestrzeni),
+        # także kilka razy w tej samej sekundzie
+        self.boot = secrets.token_hex(4)
+
+        self._lock = threading.Lock()
+        # Budzi oczekujących w wait_for_change po każdej zmianie (współdzieli blokadę z _lock)
+        self._changed = threading.Condition(self._lock)
+        self._version = 1
+        # Ring buffer wpisów (wersja, slot, sekundy epoki). _changelog_floor to najwyższa wersja,
+        # której wpisy mogły już wypaść z bufora - dla since >= floor dziennik jest kompletny.
+        self._changelog = deque(maxlen=changelog_size)
+        self._changelog_floor = self._version
+
+        # Brak pliku albo nieznane klucze zostają jako NO_KILL (niezbity/aktywny)
+        self._times = load_json_state(state_file, journal_file, layout)
+
+        # Zapisz skompaktowany snapshot (z odtworzonym dziennikiem) i zacznij dopisywać do pustego dziennika
+        self._journal = open(journal_file, 'a', encoding='utf-8')
+        self._journal_entries = 0
+        self._last_fsync = 0.0
+        # Zaplanowany fsync wpisów zapisanych po ostatnim fsync (None = wszystko utrwalone)
+        self._fsync_timer = None
+        with self._lock:
+            self._compact()
+        atexit.register(self.close)
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def snapshot(self):
+        """Zwraca (wersja, kopia tablicy czasów)."""
+        with self._lock:
+            return self._version, array('d', self._times)
+
+    def changes_since(self, since):
+        """Zwraca (wersja, [(wersja, slot, sekundy epoki), ...]) dla zmian nowszych niż `since`.
+
+        Zamiast listy zwraca None, jeśli dziennik nie obejmuje już wersji `since`.
+        """
+        with self._lock:
+            if not self._changelog_floor <= since <= self._version:
+                return self._version, None
+            return self._version, [entry for entry in self._changelog if entry[0] > since]
+
+    def apply(self, updates, expected=None):
+        """Atomowo zapisuje listę par (slot, sekundy epoki) jako jedną nową wersję.
+
+        Zwraca (nowa wersja, {slot: wartość końcowa}) tylko dla slotów, których wartość faktycznie
+        się zmieniła, w kolejności pierwszego wystąpienia. Jeśli nic się nie zmienia (np. ponownie
+        wysłane to samo zabicie), wersja nie rośnie i nic nie jest zapisywane - zwraca (bieżąca wersja, {}).
+        `expected` (lista równoległa do `updates`) to warunki compare-and-set - jeśli którykolwiek
+        nie jest spełniony, nic nie jest zapisywane i rzucany jest StateConflict.
+        """
+        with self._lock:
+            if expected is not None:
+                conflicts = find_conflicts(updates, expected, self._times.__getitem__)
+                if conflicts:
+                    raise StateConflict(self._version, conflicts)
+            final = changed_values(updates, self._times.__getitem__)
+            if not final:
+                return self._version, final
+            for slot, seconds in final.items():
+                self._times[slot] = seconds
+            self._version += 1
+            for slot, seconds in final.items():
+                if len(self._changelog) == self._changelog.maxlen:
+                    self._changelog_floor = self._changelog[0][0]
+                self._changelog.append((self._version, slot, seconds))
+            self._persist(final)
+            self._changed.notify_all()
+            return self._version, final
+
+    def wait_for_change(self, since, timeout):
+        """Czeka najwyżej `timeout` sekund, aż wersja będzie różna od `since`. Zwraca bieżącą wersję."""
+        with self._lock:
+            self._changed.wait_for(lambda: self._version != since, timeout=timeout)
+            return self._version
+
+    def close(self):
+        """Dopycha na dysk niezsynchronizowane wpisy dziennika przy zamykaniu serwera (albo przestrzeni)."""
+        with self._lock:
+            self._cancel_fsync_timer()
+            if not self._journal.closed:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._journal.close()
+        # Zamknięty magazyn nie jest już potrzebny przy wyjściu - atexit nie trzyma go w pamięci
+        atexit.unregister(self.close)
+
+    def _persist(self, changes):
+        """Dopisuje zmiany do dziennika i w razie potrzeby kompaktuje. Wywoływać z zablokowanym _lock."""
+        keys = self.layout.keys
+        # NaN nie jest poprawnym JSON-em - brak zabicia zapisujemy jako null
+        lines = "".join(json.dumps([keys[slot], None if math.isnan(seconds) else seconds]) + "\n"
+                        for slot, seconds in changes.items())
+        start = time.perf_counter()
+        try:
+            self._journal.write(lines)
+            self._journal.flush()
+            wait_s = self._last_fsync + self.fsync_interval_s - time.monotonic()
+            if wait_s <= 0:
+                self._fsync_journal()
+            elif self._fsync_timer is None:
+                self._fsync_timer = threading.Timer(wait_s, self._fsync_pending)
+                self._fsync_timer.daemon = True
+                self._fsync_timer.start()
+        except OSError as e:
+            logging.error(f"Błąd zapisu dziennika zmian: {e}")
+            return
+        self.persist_observer("journal", time.perf_counter() - start)
+        self._journal_entries += len(changes)
+        if self._journal_entries >= self.compact_every:
+            self._compact()
+
+    def _fsync_journal(self):
+        """Utrwala dziennik na dysku. Wywoływać z zablokowanym _lock."""
+        self._cancel_fsync_timer()
+        os.fsync(self._journal.fileno())
+        self._last_fsync = time.monotonic()
+
+    def _cancel_fsync_timer(self):
+        if self._fsync_timer is not None:
+            self._fsync_timer.cancel()
+            self._fsync_timer = None
+
+    def _fsync_pending(self):
+        """Wątek timera: utrwala wpisy, po których nie było już zapisu wywołującego fsync."""
+        with self._lock:
+            if self._fsync_timer is not threading.current_thread() or self._journal.closed:
+                return
+            self._fsync_timer = None
+            try:
+                self._fsync_journal()
+            except OSError as e:
+                logging.error(f"Błąd zapisu dziennika zmian: {e}")
+
+    def _compact(self):
+        """Zapisuje snapshot całego stanu i czyści dziennik. Wywoływać z zablokowanym _lock.
+
+        Awaria między zapisem snapshotu a wyczyszczeniem dziennika jest bezpieczna - ponowne
+        odtworzenie tych samych wpisów daje ten sam stan.
+        """
+        start = time.perf_counter()
+        if not save_json_snapshot(self._times, self.layout, self.state_file):
+            return
+        self.persist_observer("snapshot", time.perf_counter() - start)
+        try:
+            self._journal.truncate(0)
+            self._journal_entries = 0
+        except OSError as e:
+            logging.error(f"Błąd czyszczenia dziennika zmian: {e}")
+
+
+class SqliteStateStore:
+    """Stan w bazie SQLite (tryb WAL) współdzielonej przez wiele procesów.
+
+    Zmiana stanu, podbicie wersji i wpisy dziennika zmian idą w jednej transakcji
+    `BEGIN IMMEDIATE`, a odczyty widzą spójny snapshot bazy, więc wszystkie workery
+    widzą te same wersje. Identyfikator magazynu (`boot`) jest zapisany w bazie,
+    dzięki czemu ETagi są wspólne dla workerów i przetrwają restart.
+
+    W bazie wiersze są kluczowane napisem "CH_BOSS" (odporne na zmianę kolejności
+    CHANNELS / BOSS_CONFIG), a czasy są sekundami epoki (REAL, NULL = brak zabicia).
+    """
+
+    def __init__(self, layout, db_file, changelog_size=1000, poll_interval_s=0.05, seed_times=None, persist_observer=None):
+        self.layout = layout
+        self.persist_observer = persist_observer or _ignore_persist_timing
+        self.db_file = db_file
+        self.changelog_size = changelog_size
+        self.poll_interval_s = poll_interval_s
+        # Połączenie SQLite na wątek (połączeń nie wolno współdzielić między wątkami)
+        self._local = threading.local()
+        # Budzi oczekujących w tym procesie od razu; zmiany z innych workerów wykrywa odpytywanie
+        self._changed = threading.Condition()
+
+        conn = self._conn()
+        with transaction(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                         "store_id TEXT NOT NULL, version INTEGER NOT NULL, changelog_floor INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS kill_times (key TEXT PRIMARY KEY, killed_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS kill_changes (version INTEGER NOT NULL, key TEXT NOT NULL, killed_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS kill_changes_version ON kill_changes (version)")
+            created = conn.execute("INSERT OR IGNORE INTO meta (id, store_id, version, changelog_floor) VALUES (1, ?, 1, 1)",
+                                   (secrets.token_hex(4),)).rowcount
+            conn.executemany("INSERT OR IGNORE INTO kill_times (key, killed_at) VALUES (?, NULL)",
+                             [(key,) for key in layout.keys])
+            if created and seed_times is not None:
+                # Nowa baza - przenieś stan z dotychczasowych plików JSON
+                logging.info(f"Inicjalizuję bazę {db_file} stanem z plików JSON.")
+                conn.executemany("UPDATE kill_times SET killed_at = ? WHERE key = ?",
+                                 [(_to_sql(seconds), key) for key, seconds in zip(layout.keys, seed_times)])
+        self.boot = conn.execute("SELECT store_id FROM meta").fetchone()[0]
+
+    def version(self):
+        return self._conn().execute("SELECT version FROM meta").fetchone()[0]
+
+    def snapshot(self):
+        """Zwraca (wersja, tablica czasów) z jednego spójnego odczytu."""
+        conn = self._conn()
+        slots = self.layout.slots
+        times = self.layout.empty_times()
+        with transaction(conn, "BEGIN"):
+            version = conn.execute("SELECT version FROM meta").fetchone()[0]
+            for key, killed_at in conn.execute("SELECT key, killed_at FROM kill_times"):
+                slot = slots.get(key)
+                if slot is not None:
+                    times[slot] = _from_sql(killed_at)
+        return version, times
+
+    def changes_since(self, since):
+        """Zwraca (wersja, [(wersja, slot, sekundy epoki), ...]) albo (wersja, None), gdy dziennik nie obejmuje `since`."""
+        conn = self._conn()
+        slots = self.layout.slots
+        with transaction(conn, "BEGIN"):
+            version, floor = conn.execute("SELECT version, changelog_floor FROM meta").fetchone()
+            if not floor <= since <= version:
+                return version, None
+            rows = conn.execute("SELECT version, key, killed_at FROM kill_changes WHERE version > ? ORDER BY rowid",
+                                (since,)).fetchall()
+        return version, [(v, slots[key], _from_sql(killed_at)) for v, key, killed_at in rows if key in slots]
+
+    def apply(self, updates, expected=None):
+        """Atomowo zapisuje listę par (slot, sekundy epoki) jako jedną nową wersję (wynik i warunki `expected` jak w JournalStateStore)."""
+        keys = self.layout.keys
+        conn = self._conn()
+        start = time.perf_counter()
+        with transaction(conn):
+            # Odczyt w tej samej transakcji BEGIN IMMEDIATE - żaden inny worker nie zapisze pomiędzy
+            current = {self.layout.slots[key]: _from_sql(killed_at) for key, killed_at
+                       in conn.execute("SELECT key, killed_at FROM kill_times") if key in self.layout.slots}
+            if expected is not None:
+                conflicts = find_conflicts(updates, expected, current.__getitem__)
+                if conflicts:
+                    version = conn.execute("SELECT version FROM meta").fetchone()[0]
+                    raise StateConflict(version, conflicts)
+            final = changed_values(updates, current.__getitem__)
+            if not final:
+                return conn.execute("SELECT version FROM meta").fetchone()[0], final
+            rows = [(_to_sql(seconds), keys[slot]) for slot, seconds in final.items()]
+            conn.executemany("UPDATE kill_times SET killed_at = ? WHERE key = ?", rows)
+            conn.execute("UPDATE meta SET version = version + 1")
+            version = conn.execute("SELECT version FROM meta").fetchone()[0]
+            conn.executemany("INSERT INTO kill_changes (version, key, killed_at) VALUES (?, ?, ?)",
+                             [(version, key, killed_at) for killed_at, key in rows])
+            # Ogranicz dziennik do ostatnich changelog_size wersji
+            floor = version - self.changelog_size
+            if floor > 1:
+                conn.execute("DELETE FROM kill_changes WHERE version <= ?", (floor,))
+                conn.execute("UPDATE meta SET changelog_floor = MAX(changelog_floor, ?)", (floor,))
+        self.persist_observer("sqlite", time.perf_counter() - start)
+        with self._changed:
+            self._changed.notify_all()
+        return version, final
+
+    def wait_for_change(self, since, timeout):
+        """Czeka najwyżej `timeout` sekund, aż wersja będzie różna od `since`. Zwraca bieżącą wersję."""
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self.version()
+            remaining = deadline - time.monotonic()
+            if version != since or remaining <= 0:
+                return version
+            with self._changed:
+                self._changed.wait(min(self.poll_interval_s, remaining))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL w trybie WAL: fsync grupowany przy checkpointach, baza zawsze spójna po awarii
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,210 @@
+"""Przestrzenie (tenanty) - wiele gildii/serwerów gry obsługiwanych przez jeden proces trackera.
+
+Każda przestrzeń ma własną konfigurację kanałów i bossów, własny magazyn stanu (wersje,
+trwałość), indeks respawnów i pamięć podręczną odpowiedzi. Przestrzenie są ładowane z dysku
+przy pierwszym żądaniu, a najdawniej używane są zamykane, gdy załadowanych jest więcej niż
+`max_loaded` - pamięć procesu zależy od liczby aktywnych przestrzeni, nie od wszystkich.
+
+Żądania różnych przestrzeni nie czekają na siebie: każda ma własne blokady magazynu, a wspólna
+blokada rejestru chroni tylko słowniki (bez I/O - ładowanie i zamykanie odbywa się poza nią).
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from respawn_index import RespawnIndex
+from response_cache import ResponseCache
+
+# Dozwolone nazwy przestrzeni - nazwa jest też nazwą katalogu na dysku
+TENANT_NAME_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Plik konfiguracji w katalogu przestrzeni: {"channels": [...], "bosses": {nazwa: minuty respawnu}}
+TENANT_CONFIG_FILE = "config.json"
+# Limity konfiguracji jednej przestrzeni (ograniczają pamięć i rozmiar odpowiedzi)
+MAX_TENANT_CHANNELS = 50
+MAX_TENANT_BOSSES = 50
+
+
+class TenantNotFound(Exception):
+    """Przestrzeń o tej nazwie nie istnieje (brak katalogu z konfiguracją)."""
+
+
+def valid_tenant_name(name):
+    return isinstance(name, str) and TENANT_NAME_RE.fullmatch(name) is not None
+
+
+def parse_tenant_config(data):
+    """Sprawdza konfigurację przestrzeni i zwraca (kanały, {boss: minuty}). Rzuca ValueError z opisem błędu."""
+    if not isinstance(data, dict):
+        raise ValueError("Konfiguracja musi być obiektem JSON")
+    channels = data.get('channels')
+    bosses = data.get('bosses')
+    if not isinstance(channels, list) or not 0 < len(channels) <= MAX_TENANT_CHANNELS:
+        raise ValueError(f"Pole channels musi być niepustą listą (maksymalnie {MAX_TENANT_CHANNELS})")
+    if not isinstance(bosses, dict) or not 0 < len(bosses) <= MAX_TENANT_BOSSES:
+        raise ValueError(f"Pole bosses musi być niepustym słownikiem (maksymalnie {MAX_TENANT_BOSSES})")
+    # Najpierw typ - dopiero napisy można wstawić do zbioru
+    if not all(isinstance(channel, str) and channel for channel in channels) or len(set(channels)) != len(channels):
+        raise ValueError("Nazwy kanałów muszą być niepustymi, unikalnymi napisami")
+    for boss, minutes in bosses.items():
+        # NaN i nieskończoność (dopuszczalne w json) wyłączyłyby indeks respawnów dla bossa
+        if (not boss or isinstance(minutes, bool) or not isinstance(minutes, (int, float)) or not math.isfinite(minutes)
+                or minutes <= 0):
+            raise ValueError(f"Nieprawidłowy czas respawnu bossa {boss}")
+    # Klucz API to "KANAŁ_BOSS" - kanał z "_" dawałby niejednoznaczne klucze
+    if any("_" in channel for channel in channels):
+        raise ValueError("Nazwy kanałów nie mogą zawierać znaku _")
+    return channels, dict(bosses)
+
+
+def load_tenant_config(path):
+    """Wczytuje konfigurację przestrzeni z pliku. Rzuca TenantNotFound, gdy pliku nie ma."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise TenantNotFound(path) from None
+    return parse_tenant_config(data)
+
+
+def save_tenant_config(path, channels, bosses):
+    """Zapisuje konfigurację nowej przestrzeni atomowo. Zwraca False, jeśli plik już istnieje."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({"channels": channels, "bosses": bosses}, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        # link zamiast replace - nie nadpisuje konfiguracji utworzonej w międzyczasie przez inny worker
+        os.link(temp_path, path)
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(temp_path)
+    return True
+
+
+class Tenant:
+    """Wszystko, co należy do jednej przestrzeni: konfiguracja, magazyn stanu, historia i struktury pochodne."""
+
+    def __init__(self, name, layout, boss_config, store, history):
+        self.name = name
+        self.layout = layout
+        self.boss_config = boss_config
+        self.store = store
+        # Dopisywana historia wszystkich zmian (HistoryLog) dla analiz respawnów i aktywności
+        self.history = history
+        # Kolejka najbliższych respawnów, doganiająca magazyn przy każdym zapytaniu
+        self.respawn_index = RespawnIndex(layout, boss_config, store)
+        # Gotowe bajty JSON (i gzip/deflate) odpowiedzi odczytu dla bieżącej wersji stanu
+        self.response_cache = ResponseCache()
+
+    def boss_slot(self, key):
+        """Zwraca slot dla klucza postaci CH_BOSSNAME albo None dla nieznanego klucza."""
+        return self.layout.slots.get(key) if isinstance(key, str) else None
+
+    def close(self):
+        self.store.close()
+        self.history.close()
+
+
+class _TenantSlot:
+    """Miejsce przestrzeni w rejestrze: załadowana przestrzeń (albo None) i liczba żądań, które jej używają."""
+    __slots__ = ("tenant", "users", "lock")
+
+    def __init__(self):
+        self.tenant = None
+        self.users = 0
+        # Serializuje ładowanie i zamykanie tej jednej przestrzeni
+        self.lock = threading.Lock()
+
+
+class TenantRegistry:
+    """Leniwie ładowane przestrzenie z wyrzucaniem najdawniej używanych (LRU).
+
+    `loader(nazwa)` tworzy Tenant albo rzuca TenantNotFound. Przestrzeń używana przez trwające
+    żądanie (acquire bez release, np. long-poll) nie jest zamykana - limit może być wtedy chwilowo
+    przekroczony. Przestrzenie z `pinned` nigdy nie są wyrzucane.
+    """
+
+    def __init__(self, loader, max_loaded, pinned=()):
+        self.loader = loader
+        self.max_loaded = max_loaded
+        self.pinned = frozenset(pinned)
+        # Chroni tylko _slots i _lru - nigdy nie jest trzymana podczas I/O
+        self._lock = threading.Lock()
+        self._slots = {}
+        # Załadowane przestrzenie (poza przypiętymi), od najdawniej używanej
+        self._lru = OrderedDict()
+
+    def acquire(self, name):
+        """Zwraca przestrzeń, w razie potrzeby ładując ją z dysku. Każde acquire wymaga release(name)."""
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is None:
+                slot = self._slots[name] = _TenantSlot()
+            slot.users += 1
+        try:
+            with slot.lock:
+                if slot.tenant is None:
+                    slot.tenant = self.loader(name)
+                tenant = slot.tenant
+        except BaseException:
+            self.release(name)
+            raise
+        victims = []
+        with self._lock:
+            if name not in self.pinned:
+                self._lru[name] = None
+                self._lru.move_to_end(name)
+                victims = self._pick_victims()
+        for victim in victims:
+            self._unload(victim)
+        return tenant
+
+    def release(self, name):
+        with self._lock:
+            slot = self._slots[name]
+            slot.users -= 1
+            # Nieistniejąca przestrzeń nie zostawia po sobie miejsca w rejestrze
+            if slot.users == 0 and slot.tenant is None:
+                del self._slots[name]
+
+    def loaded_count(self):
+        with self._lock:
+            return sum(1 for slot in self._slots.values() if slot.tenant is not None)
+
+    def _pick_victims(self):
+        """Wybiera nieużywane przestrzenie do zamknięcia ponad limit. Wywoływać z zablokowanym _lock."""
+        excess = len(self._lru) - self.max_loaded
+        victims = []
+        for name in self._lru:
+            if len(victims) >= excess:
+                break
+            if self._slots[name].users == 0:
+                victims.append(name)
+        for name in victims:
+            del self._lru[name]
+        return victims
+
+    def _unload(self, name):
+        with self._lock:
+            slot = self._slots.get(name)
+        if slot is None:
+            return
+        # Zamykanie pod blokadą przestrzeni - ponowne acquire poczeka i wczyta ją dopiero po zapisie na dysk
+        with slot.lock:
+            with self._lock:
+                if slot.users or slot.tenant is None:
+                    # Ktoś zaczął jej używać po wyborze do zamknięcia - zostaje załadowana
+                    if slot.tenant is not None:
+                        self._lru[name] = None
+                    return
+                tenant, slot.tenant = slot.tenant, None
+            tenant.close()
+            with self._lock:
+                if slot.users == 0 and slot.tenant is None:
+                    del self._slots[name]
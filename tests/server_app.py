@@ -0,0 +1,57 @@
+"""Wspólne przygotowanie testów server.py: import poza katalogiem repozytorium i świeże przestrzenie na każdy test."""
+import atexit
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# server.py przy imporcie ładuje przestrzeń domyślną z plików w bieżącym katalogu - nie z plików repozytorium
+_import_dir = tempfile.mkdtemp(prefix="boss-tracker-tests-")
+atexit.register(shutil.rmtree, _import_dir, ignore_errors=True)
+_cwd = os.getcwd()
+os.chdir(_import_dir)
+try:
+    import server
+finally:
+    os.chdir(_cwd)
+
+from history_log import HistoryLog
+from tenants import Tenant, TenantRegistry
+
+
+class ServerTestCase(unittest.TestCase):
+    """Klient testowy Flask z pustą przestrzenią domyślną i katalogiem przestrzeni w katalogu tymczasowym."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        self.loaded = []
+        for name, value in (("tenants", TenantRegistry(self.load_tenant, server.MAX_LOADED_TENANTS,
+                                                       pinned=(server.DEFAULT_TENANT,))),
+                            ("TENANTS_DIR", os.path.join(self.dir, "tenants"))):
+            patcher = mock.patch.object(server, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_tenants)
+        self.client = server.app.test_client()
+
+    def load_tenant(self, name):
+        if name != server.DEFAULT_TENANT:
+            tenant = server.load_tenant(name)
+        else:
+            tenant = Tenant(name, server.LAYOUT, server.BOSS_CONFIG, server.create_state_store(server.LAYOUT, self.dir),
+                            HistoryLog(server.LAYOUT, os.path.join(self.dir, server.BOSS_HISTORY_FILE)))
+        self.loaded.append(tenant)
+        return tenant
+
+    def close_tenants(self):
+        for tenant in self.loaded:
+            tenant.close()
+
+    def update(self, key, timestamp, **fields):
+        return self.client.post('/update_boss_status', json={"key": key, "timestamp": timestamp, **fields})
+
+    def batch(self, operations):
+        return self.client.post('/batch_update', json={"operations": operations})
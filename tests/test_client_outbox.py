@@ -0,0 +1,114 @@
+"""Testy kolejki zmian klienta: które zmiany przetrwają rozstrzygnięcie i z jakim warunkiem "expected"."""
+import math
+import os
+import tempfile
+import unittest
+from array import array
+from unittest import mock
+
+import client_app
+from client_app import BossTrackerApp, epoch_to_iso, iso_to_epoch, outbox_entry_needed
+
+KEY = client_app.SLOT_KEYS[0]
+SLOT = client_app.KEY_SLOTS[KEY]
+
+
+def entry(entry_id, timestamp, expected):
+    return {"id": entry_id, "key": KEY, "timestamp": timestamp, "changed_at": "2026-01-01T12:00:00",
+            "expected": expected}
+
+
+class FakeApp:
+    """Stan okna potrzebny do rozstrzygania kolejki - bez Tk i bez sieci."""
+    _reconcile_outbox = BossTrackerApp._reconcile_outbox
+    _on_outbox_conflict = BossTrackerApp._on_outbox_conflict
+
+    def __init__(self, server_timestamp, outbox):
+        self.server_times = array('d', [math.nan] * len(client_app.SLOT_KEYS))
+        self.server_times[SLOT] = iso_to_epoch(server_timestamp)
+        self.kill_times = array('d', self.server_times)
+        self.respawn_times = array('d', self.kill_times)
+        self.outbox = outbox
+        self._outbox_sending = None
+        self.flush_delays = []
+
+    def _schedule_local_save(self):
+        pass
+
+    def update_statuses_ui(self):
+        pass
+
+    def _schedule_outbox_flush(self, delay_ms):
+        self.flush_delays.append(delay_ms)
+
+
+class OutboxEntryNeededTest(unittest.TestCase):
+    def test_newer_kill_wins_over_unseen_kill(self):
+        # Offline gracz widział stare zabicie, w międzyczasie ktoś zgłosił 11:20, a gracz zbił bossa o 12:05
+        queued = entry(1, "2026-01-01T12:05:00", "2026-01-01T09:00:00")
+        self.assertTrue(outbox_entry_needed(queued, iso_to_epoch("2026-01-01T11:20:00")))
+
+    def test_older_kill_loses_to_newer_server_kill(self):
+        queued = entry(1, "2026-01-01T11:00:00", None)
+        self.assertFalse(outbox_entry_needed(queued, iso_to_epoch("2026-01-01T11:20:00")))
+
+    def test_kill_already_on_server(self):
+        queued = entry(1, "2026-01-01T11:00:00", None)
+        self.assertFalse(outbox_entry_needed(queued, iso_to_epoch("2026-01-01T11:00:00")))
+        self.assertTrue(outbox_entry_needed(queued, math.nan))
+
+    def test_unkill_only_clears_the_kill_seen_before_click(self):
+        queued = entry(1, None, "2026-01-01T11:00:00")
+        self.assertTrue(outbox_entry_needed(queued, iso_to_epoch("2026-01-01T11:00:00")))
+        self.assertFalse(outbox_entry_needed(queued, iso_to_epoch("2026-01-01T11:40:00")))
+        self.assertFalse(outbox_entry_needed(queued, math.nan))
+
+
+class ReconcileOutboxTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(client_app, "OUTBOX_FILE", os.path.join(directory.name, "outbox.jsonl"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_conflict_resends_newer_kill_with_current_value(self):
+        app = FakeApp("2026-01-01T09:00:00", [entry(1, "2026-01-01T12:05:00", "2026-01-01T09:00:00")])
+        app._on_outbox_conflict({"conflicts": [{"key": KEY, "timestamp": "2026-01-01T11:20:00"}]})
+        self.assertEqual([e["expected"] for e in app.outbox], [epoch_to_iso(iso_to_epoch("2026-01-01T11:20:00"))])
+        self.assertEqual(app.kill_times[SLOT], iso_to_epoch("2026-01-01T12:05:00"))
+        self.assertEqual(app.flush_delays, [0])
+        self.assertEqual(client_app.load_outbox(), app.outbox)
+
+    def test_conflict_drops_unkill_of_replaced_kill(self):
+        app = FakeApp("2026-01-01T10:00:00", [entry(1, None, "2026-01-01T10:00:00")])
+        app._on_outbox_conflict({"conflicts": [{"key": KEY, "timestamp": "2026-01-01T10:40:00"}]})
+        self.assertEqual(app.outbox, [])
+        self.assertEqual(app.kill_times[SLOT], iso_to_epoch("2026-01-01T10:40:00"))
+        self.assertEqual(app.flush_delays, [])
+
+    def test_chain_of_changes_to_one_key(self):
+        app = FakeApp(None, [entry(1, "2026-01-01T10:00:05", None), entry(2, None, "2026-01-01T10:00:05")])
+        app._reconcile_outbox()
+        self.assertEqual([e["id"] for e in app.outbox], [1, 2])
+        self.assertTrue(math.isnan(app.kill_times[SLOT]))
+        # Pierwsza zmiana dotarła już na serwer - zostaje tylko odznaczenie
+        app.server_times[SLOT] = iso_to_epoch("2026-01-01T10:00:05")
+        app._reconcile_outbox()
+        self.assertEqual([e["id"] for e in app.outbox], [2])
+
+
+class LoadOutboxTest(unittest.TestCase):
+    def test_skips_damaged_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('{"id": 1, "key": "%s", "timestamp": null, "changed_at": "2026-01-01T10:00:00"}\n' % KEY)
+                f.write('{"id": 2, "key": "CH99_Nieznany", "timestamp": null, "changed_at": "2026-01-01T10:00:00"}\n')
+                f.write('{"id": 3, "key": "%s", "timest' % KEY)
+            with mock.patch.object(client_app, "OUTBOX_FILE", path):
+                self.assertEqual([e["id"] for e in client_app.load_outbox()], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Testy dziennika historii: okna czasowe (wyszukiwanie binarne w mmap) i agregacje."""
+import math
+import os
+import random
+import tempfile
+import unittest
+
+from history_log import ACTION_CLEAR, ACTION_KILL, RECORD, RECORD_SIZE, HistoryLog
+from state_store import StateLayout
+
+LAYOUT = StateLayout(["CH1", "CH2"], {"Boss A": 40, "Boss B": 41})
+
+
+class HistoryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "history.bin")
+
+    def open_log(self, records=()):
+        with open(self.path, 'ab') as f:
+            for record in records:
+                f.write(RECORD.pack(*record))
+        log = HistoryLog(LAYOUT, self.path)
+        self.addCleanup(log.close)
+        return log
+
+    def test_empty_log(self):
+        log = self.open_log()
+        self.assertEqual(list(log.records(0, math.inf)), [])
+        self.assertEqual(log.respawn_intervals(0, math.inf, 3600), {})
+
+    def test_window_matches_linear_scan(self):
+        rnd = random.Random(7)
+        records = []
+        recorded_at = 1_000_000.0
+        for _ in range(2000):
+            # Także kilka rekordów z tym samym czasem zapisu (jedna zmiana wielu slotów)
+            recorded_at += rnd.choice((0.0, rnd.uniform(0, 100)))
+            records.append((recorded_at, recorded_at - 5, rnd.randrange(2), rnd.randrange(2), ACTION_KILL))
+        log = self.open_log(records)
+        bounds = [records[0][0] - 1, records[-1][0] + 1] + [record[0] for record in rnd.sample(records, 20)]
+        for _ in range(50):
+            start, end = sorted(rnd.sample(bounds, 2))
+            with self.subTest(start=start, end=end):
+                expected = [record for record in records if start <= record[0] < end]
+                self.assertEqual(list(log.records(start, end)), expected)
+
+    def test_torn_tail_is_truncated(self):
+        with open(self.path, 'wb') as f:
+            f.write(RECORD.pack(10.0, 5.0, 0, 0, ACTION_KILL))
+            f.write(RECORD.pack(20.0, 15.0, 0, 1, ACTION_KILL)[:RECORD_SIZE // 2])
+        log = self.open_log()
+        self.assertEqual(os.path.getsize(self.path), RECORD_SIZE)
+        log.append({LAYOUT.slots["CH2_Boss B"]: 1234.0})
+        self.assertEqual([record[1:] for record in log.records(0, math.inf)],
+                         [(5.0, 0, 0, ACTION_KILL), (1234.0, 1, 1, ACTION_KILL)])
+
+    def test_respawn_intervals_and_kill_counts(self):
+        minute = 60.0
+        records = [
+            (100 * minute, 100 * minute, 0, 0, ACTION_KILL),
+            (141 * minute, 141 * minute, 0, 0, ACTION_KILL),
+            (141 * minute, math.nan, 0, 0, ACTION_CLEAR),
+            (181 * minute, 181 * minute, 0, 0, ACTION_KILL),
+            (182 * minute, 182 * minute, 1, 1, ACTION_KILL),
+            # Przerwa dłuższa niż max_interval - nie jest czasem respawnu
+            (500 * minute, 500 * minute, 0, 0, ACTION_KILL),
+        ]
+        log = self.open_log(records)
+        intervals = log.respawn_intervals(120 * minute, 1000 * minute, 120 * minute)
+        self.assertEqual({boss: list(values) for boss, values in intervals.items()}, {0: [40 * minute, 41 * minute]})
+        # Zabicie sprzed okna wyznacza odstęp pierwszego zabicia w oknie
+        intervals = log.respawn_intervals(141 * minute, 150 * minute, 120 * minute)
+        self.assertEqual(list(intervals[0]), [41 * minute])
+
+        per_channel, per_boss, hour_of_day, hourly = log.kill_counts(0, 1000 * minute)
+        self.assertEqual((per_channel[0], per_channel[1]), (4, 1))
+        self.assertEqual((per_boss[0], per_boss[1]), (4, 1))
+        self.assertEqual(sum(hour_of_day), 5)
+        self.assertEqual(hourly[1], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
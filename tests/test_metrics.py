@@ -0,0 +1,68 @@
+"""Testy metryk: format tekstowy Prometheusa i szacowanie liczby klientów."""
+import unittest
+from unittest import mock
+
+import metrics
+from metrics import ActiveClients, Counter, Gauge, Histogram, Registry
+
+
+class RegistryTest(unittest.TestCase):
+    def test_render(self):
+        registry = Registry()
+        requests_total = registry.register(Counter("requests_total", "Żądania.", ("endpoint", "status")))
+        duration = registry.register(Histogram("duration_seconds", "Czas.", ("endpoint",), buckets=(0.1, 1.0)))
+        registry.register(Gauge("version", "Wersja.", lambda: 7))
+        requests_total.inc('/get_state', 200)
+        requests_total.inc('/get_state', 200)
+        requests_total.inc('/a"b', 404)
+        duration.observe(0.05, '/get_state')
+        duration.observe(0.5, '/get_state')
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP requests_total Żądania.",
+            "# TYPE requests_total counter",
+            'requests_total{endpoint="/a\\"b",status="404"} 1',
+            'requests_total{endpoint="/get_state",status="200"} 2',
+            "# HELP duration_seconds Czas.",
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{endpoint="/get_state",le="0.1"} 1',
+            'duration_seconds_bucket{endpoint="/get_state",le="1.0"} 2',
+            'duration_seconds_bucket{endpoint="/get_state",le="+Inf"} 2',
+            'duration_seconds_sum{endpoint="/get_state"} 0.55',
+            'duration_seconds_count{endpoint="/get_state"} 2',
+            "# HELP version Wersja.",
+            "# TYPE version gauge",
+            "version 7",
+        ])
+
+
+class ActiveClientsTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(metrics.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_window(self):
+        clients = ActiveClients(60)
+        clients.seen("a")
+        self.now += 30
+        clients.seen("b")
+        clients.seen("a")
+        self.now += 45
+        # "a" był widziany ponownie - liczy się ostatnie żądanie
+        self.assertEqual(clients.count(), 2)
+        self.now += 20
+        self.assertEqual(clients.count(), 0)
+
+    def test_evicts_least_recently_seen_over_limit(self):
+        clients = ActiveClients(60, max_tracked=3)
+        for client in ("a", "b", "c"):
+            clients.seen(client)
+        clients.seen("a")
+        clients.seen("d")
+        self.assertEqual(list(clients._last_seen), ["c", "a", "d"])
+        self.assertEqual(clients.count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Testy indeksu respawnów: wyniki kopców porównane z przeglądem wszystkich slotów."""
+import math
+import os
+import random
+import tempfile
+import unittest
+
+from respawn_index import RespawnIndex
+from state_store import NO_KILL, JournalStateStore, StateLayout, now_epoch
+
+BOSSES = {"Boss A": 40, "Boss B": 41, "Boss C": 30}
+LAYOUT = StateLayout(["CH1", "CH2", "CH3"], BOSSES)
+
+
+class RespawnIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = JournalStateStore(LAYOUT, os.path.join(directory.name, "state.json"),
+                                       os.path.join(directory.name, "state.journal"))
+        self.addCleanup(self.store.close)
+        self.index = RespawnIndex(LAYOUT, BOSSES, self.store)
+
+    def expected(self, limit, now, channel_idx=None):
+        _, times = self.store.snapshot()
+        respawns = []
+        for slot, killed_at in enumerate(times):
+            ch_idx, boss_idx = LAYOUT.split_slot(slot)
+            respawn_at = killed_at + BOSSES[LAYOUT.bosses[boss_idx]] * 60
+            if (channel_idx is None or ch_idx == channel_idx) and respawn_at > now:
+                respawns.append((respawn_at, slot))
+        return sorted(respawns)[:limit]
+
+    def test_matches_scan_of_all_slots(self):
+        rng = random.Random(7)
+        now = now_epoch()
+        for _ in range(300):
+            slot = rng.randrange(len(LAYOUT))
+            # Część zabić jest już odrodzona; respawny wypadają 30 s od pełnej minuty względem `now`,
+            # więc upływ czasu w trakcie testu nie zmienia wyniku
+            killed_at = NO_KILL if rng.random() < 0.2 else now - 60 * rng.randint(0, 60) + 30
+            self.store.apply([(slot, killed_at)])
+            limit = rng.randint(1, len(LAYOUT))
+            channel_idx = rng.choice([None, 0, 1, 2])
+            _, result = self.index.next_respawns(limit, channel_idx=channel_idx)
+            self.assertEqual(result, self.expected(limit, now, channel_idx))
+        # Nieaktualne wpisy nie gromadzą się w kopcach
+        self.assertLessEqual(len(self.index._heaps[-1]), 4 * len(LAYOUT) + 1)
+
+    def test_client_now(self):
+        base = now_epoch()
+        self.store.apply([(0, base - 3600), (1, base - 1200), (4, base)])
+        version, result = self.index.next_respawns(10, now=base - 1800)
+        self.assertEqual(version, self.store.version())
+        self.assertEqual(result, self.expected(10, base - 1800))
+        self.assertEqual(len(result), 3)
+        self.assertEqual(self.index.next_respawns(10, now=base - 1800, channel_idx=1)[1], [(base + 41 * 60, 4)])
+
+    def test_cleared_kill_is_not_returned(self):
+        now = now_epoch()
+        self.store.apply([(0, now), (1, now)])
+        self.assertEqual([slot for _, slot in self.index.next_respawns(10)[1]], [0, 1])
+        self.store.apply([(0, NO_KILL)])
+        self.assertEqual([slot for _, slot in self.index.next_respawns(10)[1]], [1])
+        self.assertTrue(math.isnan(self.index._respawn_at[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
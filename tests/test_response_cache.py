@@ -0,0 +1,59 @@
+"""Testy pamięci podręcznej zakodowanych odpowiedzi."""
+import gzip
+import unittest
+import zlib
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from response_cache import EncodedResponse, ResponseCache
+
+BODY = b'{"CH1_Boss A": null, "CH1_Boss B": null, "CH2_Boss A": null, "CH2_Boss B": null}\n'
+
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+
+class EncodedResponseTest(unittest.TestCase):
+    def test_negotiates_encoding(self):
+        entry = EncodedResponse(3, BODY)
+        encoding, body = entry.encoded(accept("gzip, deflate"))
+        self.assertEqual((encoding, gzip.decompress(body)), ("gzip", BODY))
+        encoding, body = entry.encoded(accept("deflate"))
+        self.assertEqual((encoding, zlib.decompress(body)), ("deflate", BODY))
+        self.assertEqual(entry.encoded(accept("")), (None, BODY))
+        self.assertEqual(entry.encoded(accept("br")), (None, BODY))
+
+    def test_short_body_is_not_compressed(self):
+        self.assertEqual(EncodedResponse(1, b"{}\n").encoded(accept("gzip")), (None, b"{}\n"))
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_entries_belong_to_one_version(self):
+        cache = ResponseCache()
+        cache.put("state", 2, BODY)
+        self.assertEqual(cache.get("state", 2).identity, BODY)
+        self.assertIsNone(cache.get("state", 1))
+        cache.invalidate(3)
+        self.assertIsNone(cache.get("state", 2))
+        self.assertIsNone(cache.get("state", 3))
+
+    def test_stale_put_is_returned_but_not_cached(self):
+        cache = ResponseCache()
+        cache.invalidate(5)
+        entry = cache.put("state", 4, BODY)
+        self.assertEqual((entry.version, entry.identity), (4, BODY))
+        self.assertIsNone(cache.get("state", 4))
+        self.assertIsNone(cache.get("state", 5))
+
+    def test_max_entries(self):
+        cache = ResponseCache(max_entries=2)
+        for since in range(3):
+            cache.put(("changes", since), 1, BODY)
+        self.assertIsNotNone(cache.get(("changes", 1), 1))
+        self.assertIsNone(cache.get(("changes", 2), 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
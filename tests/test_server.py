@@ -0,0 +1,236 @@
+"""Testy endpointów server.py przez klienta testowego Flask."""
+import gzip
+import threading
+import time
+import unittest
+from unittest import mock
+
+import state_store
+from metrics import ActiveClients
+from server_app import ServerTestCase, server
+
+KEY = server.LAYOUT.keys[0]
+OTHER_KEY = server.LAYOUT.keys[1]
+KILLED_AT = "2026-01-01T10:00:00"
+
+
+class GetStateTest(ServerTestCase):
+    def test_conditional_get(self):
+        first = self.client.get('/get_state')
+        self.assertEqual(first.status_code, 200)
+        self.assertIsNone(first.get_json()[KEY])
+        etag = first.headers["ETag"]
+        not_modified = self.client.get('/get_state', headers={"If-None-Match": etag})
+        self.assertEqual((not_modified.status_code, not_modified.data), (304, b""))
+        self.assertEqual(not_modified.headers["ETag"], etag)
+
+    def test_change_invalidates_etag(self):
+        etag = self.client.get('/get_state').headers["ETag"]
+        self.update(KEY, KILLED_AT)
+        response = self.client.get('/get_state', headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[KEY], KILLED_AT)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+
+class ChangesTest(ServerTestCase):
+    def test_delta_since_version(self):
+        boot = self.client.get('/changes').get_json()["boot"]
+        self.update(KEY, KILLED_AT)
+        self.update(OTHER_KEY, KILLED_AT)
+        data = self.client.get('/changes', query_string={"since": 2, "boot": boot}).get_json()
+        self.assertEqual((data["since"], data["version"], data["full"]), (2, 3, False))
+        self.assertEqual(data["changes"], [{"version": 3, "key": OTHER_KEY, "timestamp": KILLED_AT}])
+
+    def test_unknown_boot_gets_full_snapshot(self):
+        self.update(KEY, KILLED_AT)
+        data = self.client.get('/changes', query_string={"since": 1, "boot": "inny"}).get_json()
+        self.assertTrue(data["full"])
+        self.assertEqual(data["state"][KEY], KILLED_AT)
+        self.assertEqual(len(data["state"]), len(server.LAYOUT.keys))
+
+    def test_conditional_get(self):
+        response = self.client.get('/changes')
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get('/changes', headers={"If-None-Match": etag}).status_code, 304)
+        self.update(KEY, KILLED_AT)
+        self.assertEqual(self.client.get('/changes', headers={"If-None-Match": etag}).status_code, 200)
+
+
+class WaitForChangeTest(ServerTestCase):
+    def test_change_wakes_waiting_request(self):
+        boot = self.client.get('/changes').get_json()["boot"]
+        result = {}
+
+        def wait():
+            client = server.app.test_client()
+            start = time.monotonic()
+            result["data"] = client.get('/wait_for_change', query_string={"since": 1, "boot": boot, "timeout": 10}).get_json()
+            result["elapsed"] = time.monotonic() - start
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.2)
+        self.update(KEY, KILLED_AT)
+        waiter.join(10)
+        self.assertFalse(waiter.is_alive())
+        self.assertLess(result["elapsed"], 5)
+        self.assertEqual(result["data"]["changes"], [{"version": 2, "key": KEY, "timestamp": KILLED_AT}])
+
+    def test_timeout_returns_empty_changes(self):
+        boot = self.client.get('/changes').get_json()["boot"]
+        data = self.client.get('/wait_for_change', query_string={"since": 1, "boot": boot, "timeout": 0.1}).get_json()
+        self.assertEqual((data["version"], data["full"], data["changes"]), (1, False, []))
+
+    def test_stale_boot_does_not_wait(self):
+        start = time.monotonic()
+        data = self.client.get('/wait_for_change', query_string={"since": 1, "boot": "inny", "timeout": 10}).get_json()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(data["full"])
+
+
+class MutationResponseTest(ServerTestCase):
+    def test_update_returns_new_version_and_changes(self):
+        response = self.update(KEY, KILLED_AT)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["message"], "Status zaktualizowany pomyślnie")
+        self.assertEqual((data["since"], data["version"], data["full"]), (1, 2, False))
+        self.assertEqual(data["changes"], [{"version": 2, "key": KEY, "timestamp": KILLED_AT}])
+        # ETag odpowiedzi to ETag stanu po zmianie - następny GET dostanie 304
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get('/get_state', headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_repeated_update_keeps_version(self):
+        self.update(KEY, KILLED_AT)
+        data = self.update(KEY, KILLED_AT).get_json()
+        self.assertEqual((data["since"], data["version"], data["changes"]), (2, 2, []))
+
+    def test_reset_channel_reports_cleared_keys(self):
+        self.update(KEY, KILLED_AT)
+        channel = KEY.split("_", 1)[0]
+        data = self.client.post(f'/reset_channel/{channel}').get_json()
+        self.assertEqual(data["reseted_bosses_count"], 1)
+        self.assertEqual(data["changes"], [{"version": 3, "key": KEY, "timestamp": None}])
+
+
+class NextRespawnsTest(ServerTestCase):
+    def test_nearest_respawns_for_client_now(self):
+        self.update(KEY, "2026-01-01T10:00:00")
+        self.update(OTHER_KEY, "2026-01-01T09:50:00")
+        data = self.client.get('/next_respawns', query_string={"now": "2026-01-01T10:05:00", "limit": 1}).get_json()
+        self.assertEqual((data["version"], data["now"]), (3, "2026-01-01T10:05:00"))
+        channel, boss = OTHER_KEY.split("_", 1)
+        respawn_at = state_store.epoch_to_iso(state_store.iso_to_epoch("2026-01-01T09:50:00") + server.BOSS_CONFIG[boss] * 60)
+        self.assertEqual(data["respawns"], [{"channel": channel, "boss": boss, "key": OTHER_KEY, "respawn_at": respawn_at}])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/next_respawns', query_string={"channel": "CH99"}).status_code, 400)
+        self.assertEqual(self.client.get('/next_respawns', query_string={"now": "jutro"}).status_code, 400)
+
+
+class EncodedResponseTest(ServerTestCase):
+    def test_compressed_variants_share_weak_etag(self):
+        self.update(KEY, KILLED_AT)
+        plain = self.client.get('/get_state', headers={"Accept-Encoding": "identity"})
+        compressed = self.client.get('/get_state', headers={"Accept-Encoding": "gzip"})
+        self.assertIsNone(plain.headers.get("Content-Encoding"))
+        self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertIn("Accept-Encoding", compressed.headers["Vary"])
+        # Różne bajty tej samej wersji - ETag musi być słaby
+        self.assertTrue(compressed.headers["ETag"].startswith('W/"'))
+        self.assertEqual(compressed.headers["ETag"], plain.headers["ETag"])
+        response = self.client.get('/get_state', headers={"If-None-Match": compressed.headers["ETag"],
+                                                          "Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached_body_follows_new_version(self):
+        self.assertIsNone(self.client.get('/get_state').get_json()[KEY])
+        self.update(KEY, KILLED_AT)
+        response = self.client.get('/get_state')
+        self.assertEqual(response.get_json()[KEY], KILLED_AT)
+        self.assertTrue(response.headers["ETag"].endswith('-2"'))
+
+
+class MetricsTest(ServerTestCase):
+    def test_requests_are_counted_per_route(self):
+        self.client.get('/get_state')
+        self.client.get('/t/nieznana/get_state')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type, server.Registry.CONTENT_TYPE)
+        text = response.get_data(as_text=True)
+        self.assertRegex(text, r'boss_tracker_http_requests_total\{endpoint="/get_state",method="GET",status="200"\} \d+')
+        self.assertIn('boss_tracker_http_requests_total{endpoint="/t/<tenant>/get_state",method="GET",status="404"}', text)
+        self.assertIn('boss_tracker_http_request_duration_seconds_count{endpoint="/get_state"}', text)
+        self.assertIn("boss_tracker_state_version ", text)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxy(self):
+        with mock.patch.object(server, "active_clients", ActiveClients(60)) as clients:
+            for address in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+                self.client.get('/get_state', headers={"X-Forwarded-For": address})
+            self.assertEqual(clients.count(), 1)
+
+
+class BatchUpdateTest(ServerTestCase):
+    def test_operations_share_one_version(self):
+        channel = KEY.split("_", 1)[0]
+        response = self.batch([{"key": KEY, "timestamp": KILLED_AT}, {"key": OTHER_KEY, "timestamp": KILLED_AT},
+                               {"reset_channel": channel}, {"key": KEY, "timestamp": KILLED_AT}])
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual((data["applied"], data["since"], data["version"]), (4, 1, 2))
+        # Reset kanału wyczyścił OTHER_KEY, a KEY ustawiła ostatnia operacja - stan nie zmienił się tylko dla KEY
+        self.assertEqual(data["changes"], [{"version": 2, "key": KEY, "timestamp": KILLED_AT}])
+
+    def test_invalid_operation_applies_nothing(self):
+        for operation in ({"key": "CH99_Nieznany", "timestamp": KILLED_AT}, {"key": OTHER_KEY, "timestamp": "wczoraj"},
+                          {"reset_channel": "CH99"}, "KEY"):
+            with self.subTest(operation=operation):
+                response = self.batch([{"key": KEY, "timestamp": KILLED_AT}, operation])
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()["index"], 1)
+                self.assertIsNone(self.client.get('/get_state').get_json()[KEY])
+
+    def test_rejects_missing_or_too_many_operations(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.client.post('/batch_update', json={}).status_code, 400)
+        operations = [{"key": KEY, "timestamp": KILLED_AT}] * (server.MAX_BATCH_OPERATIONS + 1)
+        self.assertEqual(self.batch(operations).status_code, 400)
+
+
+class CompareAndSetTest(ServerTestCase):
+    def test_update_with_stale_expected_returns_current_value(self):
+        self.update(KEY, KILLED_AT)
+        response = self.update(KEY, None, expected=None)
+        self.assertEqual(response.status_code, 409)
+        data = response.get_json()
+        self.assertEqual((data["version"], data["conflicts"]), (2, [{"key": KEY, "timestamp": KILLED_AT}]))
+        self.assertEqual(self.update(KEY, None, expected=KILLED_AT).status_code, 200)
+
+    def test_batch_conflict_applies_nothing(self):
+        self.update(KEY, KILLED_AT)
+        response = self.batch([{"key": OTHER_KEY, "timestamp": KILLED_AT, "expected": None},
+                               {"key": KEY, "timestamp": "2026-01-01T11:00:00", "expected": None}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()["conflicts"], [{"key": KEY, "timestamp": KILLED_AT}])
+        self.assertIsNone(self.client.get('/get_state').get_json()[OTHER_KEY])
+
+    def test_reset_channel_with_stale_expected(self):
+        self.update(KEY, KILLED_AT)
+        channel = KEY.split("_", 1)[0]
+        response = self.client.post(f'/reset_channel/{channel}', json={"expected": {KEY: "2026-01-01T09:00:00"}})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get('/get_state').get_json()[KEY], KILLED_AT)
+
+    def test_malformed_expected(self):
+        message = "Błąd: Nieprawidłowy format oczekiwanej wartości (expected)"
+        response = self.update(KEY, KILLED_AT, expected="wczoraj")
+        self.assertEqual((response.status_code, response.get_json()["message"]), (400, message))
+        response = self.batch([{"key": KEY, "timestamp": KILLED_AT, "expected": "wczoraj"}])
+        self.assertEqual((response.status_code, response.get_json()), (400, {"message": message, "index": 0}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+"""Testy magazynów stanu: odtwarzanie dziennika po awarii, wspólny kontrakt obu magazynów i compare-and-set."""
+import math
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import state_store
+from state_store import (NO_KILL, JournalStateStore, SqliteStateStore, StateConflict, StateLayout, find_conflicts,
+                         load_json_state)
+
+LAYOUT = StateLayout(["CH1", "CH2"], {"Boss A": 40, "Boss B": 41})
+A1, B1, A2 = LAYOUT.slots["CH1_Boss A"], LAYOUT.slots["CH1_Boss B"], LAYOUT.slots["CH2_Boss A"]
+
+
+class FindConflictsTest(unittest.TestCase):
+    def test_matching_and_unconditional_updates(self):
+        current = [100.0, NO_KILL, NO_KILL, NO_KILL]
+        updates = [(A1, 200.0), (B1, 300.0), (A2, 400.0)]
+        self.assertEqual(find_conflicts(updates, [100.0, NO_KILL, None], current.__getitem__), {})
+
+    def test_mismatch_reports_current_value(self):
+        current = [100.0, 150.0, NO_KILL, NO_KILL]
+        conflicts = find_conflicts([(A1, 200.0), (B1, NO_KILL)], [100.0, NO_KILL], current.__getitem__)
+        self.assertEqual(conflicts, {B1: 150.0})
+
+    def test_later_update_expects_value_set_by_earlier_one(self):
+        current = [100.0, NO_KILL, NO_KILL, NO_KILL]
+        updates = [(A1, 200.0), (A1, NO_KILL)]
+        self.assertEqual(find_conflicts(updates, [100.0, 200.0], current.__getitem__), {})
+        # Druga zmiana oczekuje wartości sprzed pierwszej - konflikt z bieżącą wartością magazynu
+        self.assertEqual(find_conflicts(updates, [100.0, 100.0], current.__getitem__), {A1: 100.0})
+
+
+class JournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.dir.name, "state.json")
+        self.journal_file = os.path.join(self.dir.name, "state.journal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def open_store(self, **kwargs):
+        store = JournalStateStore(LAYOUT, self.state_file, self.journal_file, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_torn_last_line_is_skipped(self):
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            f.write('["CH1_Boss A", 1000.0]\n["CH1_Boss B", null]\n["CH2_Boss A", 30')
+        times = load_json_state(self.state_file, self.journal_file, LAYOUT)
+        self.assertEqual(times[A1], 1000.0)
+        self.assertTrue(math.isnan(times[B1]))
+        self.assertTrue(math.isnan(times[A2]))
+
+    def test_writes_after_torn_line_survive_restart(self):
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            f.write('["CH1_Boss A", 1000.0]\n["CH2_Boss A", 30')
+        store = self.open_store(fsync_interval_s=0)
+        store.apply([(B1, 2000.0)])
+        store.close()
+        _, times = self.open_store().snapshot()
+        self.assertEqual((times[A1], times[B1]), (1000.0, 2000.0))
+        self.assertTrue(math.isnan(times[A2]))
+
+    def test_grouped_writes_are_synced_without_a_later_write(self):
+        store = self.open_store(fsync_interval_s=0.5)
+        store.apply([(A1, 1000.0)])
+        with mock.patch.object(state_store.os, "fsync", wraps=os.fsync) as fsync:
+            store.apply([(B1, 2000.0)])
+            self.assertEqual(fsync.call_count, 0)
+            deadline = time.monotonic() + 5
+            while not fsync.call_count and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(fsync.call_count, 1)
+            # Zamknięcie po utrwaleniu nie zostawia działającego timera
+            store.close()
+            self.assertIsNone(store._fsync_timer)
+
+    def test_journal_is_kept_until_snapshot_directory_is_synced(self):
+        store = self.open_store(compact_every=2)
+        store.apply([(A1, 1000.0)])
+        with mock.patch.object(state_store, "fsync_directory", side_effect=OSError("EIO")) as fsync_directory:
+            store.apply([(B1, 2000.0)])
+        fsync_directory.assert_called_once_with(self.state_file)
+        # Nieutrwalony snapshot - wpisy zostają w dzienniku
+        with open(self.journal_file, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        store.apply([(A2, 3000.0)])
+        with open(self.journal_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "")
+        store.close()
+        _, times = self.open_store().snapshot()
+        self.assertEqual((times[A1], times[B1], times[A2]), (1000.0, 2000.0, 3000.0))
+
+    def test_reload_gets_new_boot_id(self):
+        first = self.open_store()
+        first.apply([(A1, 1000.0)])
+        first.close()
+        # Wersja zaczyna się od 1 po każdym wczytaniu - boot musi odróżnić te wersje od poprzednich
+        self.assertNotEqual(self.open_store().boot, first.boot)
+
+
+class StoreContract:
+    """Wspólne testy obu magazynów; podklasa tworzy magazyn w open_store."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_changelog_floor(self):
+        store = self.open_store(changelog_size=3)
+        for i in range(5):
+            store.apply([(A1, 1000.0 + i)])
+        version = store.version()
+        self.assertEqual(version, 6)
+        self.assertEqual(store.changes_since(version), (version, []))
+        _, changes = store.changes_since(version - 3)
+        self.assertEqual([v for v, _, _ in changes], [version - 2, version - 1, version])
+        self.assertEqual(changes[-1][1:], (A1, 1004.0))
+        # Starsze wersje wypadły z dziennika, a wersja z przyszłości nie pochodzi z tego magazynu
+        self.assertIsNone(store.changes_since(1)[1])
+        self.assertIsNone(store.changes_since(version + 1)[1])
+
+    def test_apply_returns_only_changed_slots(self):
+        store = self.open_store()
+        version, changes = store.apply([(A1, 1000.0), (B1, NO_KILL)])
+        self.assertEqual((version, changes), (2, {A1: 1000.0}))
+        # Ponownie wysłane to samo zabicie nie tworzy wersji
+        self.assertEqual(store.apply([(A1, 1000.0), (B1, NO_KILL)]), (2, {}))
+        self.assertEqual(store.version(), 2)
+
+    def test_last_update_of_slot_wins(self):
+        store = self.open_store()
+        self.assertEqual(store.apply([(A1, 1000.0), (A1, 2000.0)]), (2, {A1: 2000.0}))
+        self.assertEqual(store.snapshot()[1][A1], 2000.0)
+
+
+    def test_conflict_writes_nothing(self):
+        store = self.open_store()
+        store.apply([(A1, 1000.0)])
+        with self.assertRaises(StateConflict) as raised:
+            store.apply([(A1, 2000.0), (B1, 3000.0)], [NO_KILL, None])
+        self.assertEqual((raised.exception.version, raised.exception.current), (2, {A1: 1000.0}))
+        _, times = store.snapshot()
+        self.assertEqual(times[A1], 1000.0)
+        self.assertTrue(math.isnan(times[B1]))
+        self.assertEqual(store.apply([(A1, 2000.0)], [1000.0]), (3, {A1: 2000.0}))
+
+
+class JournalStoreTest(StoreContract, unittest.TestCase):
+    def open_store(self, changelog_size=1000):
+        store = JournalStateStore(LAYOUT, os.path.join(self.dir.name, "state.json"),
+                                  os.path.join(self.dir.name, "state.journal"), changelog_size=changelog_size)
+        self.addCleanup(store.close)
+        return store
+
+
+class SqliteStoreTest(StoreContract, unittest.TestCase):
+    def open_store(self, changelog_size=1000):
+        store = SqliteStateStore(LAYOUT, os.path.join(self.dir.name, "state.db"), changelog_size=changelog_size)
+        self.addCleanup(store.close)
+        return store
+
+    def test_workers_share_state(self):
+        # Dwa magazyny na jednym pliku to dwa workery gunicorna
+        first, second = self.open_store(), self.open_store()
+        version, _ = first.apply([(A1, 1000.0)])
+        seen_version, times = second.snapshot()
+        self.assertEqual((seen_version, times[A1]), (version, 1000.0))
+        self.assertEqual(second.apply([(B1, 2000.0)])[0], version + 1)
+        self.assertEqual(first.snapshot()[1][B1], 2000.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
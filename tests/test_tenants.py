@@ -0,0 +1,113 @@
+"""Testy konfiguracji przestrzeni i rejestru z wyrzucaniem LRU."""
+import threading
+import unittest
+
+from tenants import TenantNotFound, TenantRegistry, parse_tenant_config
+
+
+class ParseTenantConfigTest(unittest.TestCase):
+    def test_valid_config(self):
+        channels, bosses = parse_tenant_config({"channels": ["A", "B"], "bosses": {"X": 40, "Y": 41.5}})
+        self.assertEqual((channels, bosses), (["A", "B"], {"X": 40, "Y": 41.5}))
+
+    def test_invalid_configs(self):
+        for config in ({"channels": [[1]], "bosses": {"X": 40}},
+                       {"channels": ["A", "A"], "bosses": {"X": 40}},
+                       {"channels": ["A_1"], "bosses": {"X": 40}},
+                       {"channels": ["A"], "bosses": {"X": float("nan")}},
+                       {"channels": ["A"], "bosses": {"X": float("inf")}},
+                       {"channels": ["A"], "bosses": {"X": True}},
+                       {"channels": ["A"], "bosses": {"X": 0}},
+                       {"channels": [], "bosses": {"X": 40}},
+                       ["A"]):
+            with self.subTest(config=config), self.assertRaises(ValueError):
+                parse_tenant_config(config)
+
+
+class FakeTenant:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TenantRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.loaded = []
+
+    def loader(self, name):
+        if name == "missing":
+            raise TenantNotFound(name)
+        tenant = FakeTenant(name)
+        self.loaded.append(tenant)
+        return tenant
+
+    def use(self, registry, name):
+        tenant = registry.acquire(name)
+        registry.release(name)
+        return tenant
+
+    def test_least_recently_used_is_closed(self):
+        registry = TenantRegistry(self.loader, max_loaded=2)
+        a, b = self.use(registry, "a"), self.use(registry, "b")
+        self.use(registry, "a")
+        c = self.use(registry, "c")
+        self.assertEqual((a.closed, b.closed, c.closed), (False, True, False))
+        self.assertEqual(registry.loaded_count(), 2)
+        # Wyrzucona przestrzeń jest wczytywana od nowa
+        self.assertIsNot(self.use(registry, "b"), b)
+
+    def test_tenant_in_use_is_not_closed(self):
+        registry = TenantRegistry(self.loader, max_loaded=1)
+        a = registry.acquire("a")
+        b = self.use(registry, "b")
+        c = self.use(registry, "c")
+        self.assertFalse(a.closed)
+        self.assertTrue(b.closed)
+        self.assertIs(registry.acquire("a"), a)
+        registry.release("a")
+        registry.release("a")
+        self.use(registry, "d")
+        self.assertTrue(a.closed)
+        self.assertTrue(c.closed)
+
+    def test_pinned_tenant_is_never_closed(self):
+        registry = TenantRegistry(self.loader, max_loaded=1, pinned=("default",))
+        default = self.use(registry, "default")
+        for name in ("a", "b", "c"):
+            self.use(registry, name)
+        self.assertFalse(default.closed)
+        self.assertIs(self.use(registry, "default"), default)
+
+    def test_missing_tenant_leaves_no_slot(self):
+        registry = TenantRegistry(self.loader, max_loaded=1)
+        with self.assertRaises(TenantNotFound):
+            registry.acquire("missing")
+        self.assertEqual(registry._slots, {})
+
+    def test_concurrent_acquire_loads_once(self):
+        registry = TenantRegistry(self.loader, max_loaded=1)
+        barrier = threading.Barrier(8)
+        seen = []
+
+        def worker():
+            barrier.wait()
+            seen.append(registry.acquire("a"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.loaded), 1)
+        self.assertTrue(all(tenant is seen[0] for tenant in seen))
+        for _ in seen:
+            registry.release("a")
+        self.use(registry, "b")
+        self.assertTrue(seen[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()